@@ -0,0 +1,36 @@
+#!/usr/bin/env bash
+# Start the web server. SERVER picks how:
+#   daphne   (default) ASGI in one process: async views and live updates over WebSockets
+#   uvicorn  ASGI with WEB_CONCURRENCY processes; needs REDIS_URL so the board
+#            cache and live updates are shared between them
+#   gunicorn WSGI, WEB_CONCURRENCY processes x GUNICORN_THREADS threads; no
+#            WebSockets, open pages fall back to reloading at rotation time
+set -o errexit
+
+PORT="${PORT:-8000}"
+WEB_CONCURRENCY="${WEB_CONCURRENCY:-2}"
+
+case "${SERVER:-daphne}" in
+    daphne|uvicorn)
+        # Each ASGI request runs its sync database work on its own thread, so
+        # persistent connections would never be reused
+        export CONN_MAX_AGE="${CONN_MAX_AGE:-0}"
+        ;;
+esac
+
+case "${SERVER:-daphne}" in
+    daphne)
+        exec daphne --bind 0.0.0.0 --port "$PORT" amiga.asgi:application
+        ;;
+    uvicorn)
+        exec uvicorn amiga.asgi:application --host 0.0.0.0 --port "$PORT" --workers "$WEB_CONCURRENCY"
+        ;;
+    gunicorn)
+        exec gunicorn amiga.wsgi:application --bind "0.0.0.0:$PORT" \
+            --workers "$WEB_CONCURRENCY" --threads "${GUNICORN_THREADS:-4}"
+        ;;
+    *)
+        echo "Unknown SERVER '$SERVER' (expected daphne, uvicorn or gunicorn)" >&2
+        exit 1
+        ;;
+esac
@@ -0,0 +1,109 @@
+// The board is cached for everyone, so the viewer's own row is marked here
+document.querySelectorAll(`.amigos-table tr[data-user-id="${document.body.dataset.userId}"]`)
+    .forEach(row => row.classList.add('user-highlight'));
+
+// Countdown to the next rotation (pushed by the server when it changes)
+let nextRotation = new Date(document.body.dataset.nextRotation);
+let amigosReloadScheduled = false;
+
+function updateAmigosCountdown() {
+    const diff = Math.max(nextRotation - new Date(), 0);
+
+    // Fallback in case the rotation event never arrives
+    if (diff === 0 && !amigosReloadScheduled) {
+        amigosReloadScheduled = true;
+        setTimeout(() => location.reload(), 30000 + Math.random() * 30000);
+    }
+    
+    const days = Math.floor(diff / (1000 * 60 * 60 * 24));
+    const hours = Math.floor((diff % (1000 * 60 * 60 * 24)) / (1000 * 60 * 60));
+    const minutes = Math.floor((diff % (1000 * 60 * 60)) / (1000 * 60));
+    const seconds = Math.floor((diff % (1000 * 60)) / 1000);
+    
+    document.getElementById('amigos-days').textContent = days.toString().padStart(2, '0');
+    document.getElementById('amigos-hours').textContent = hours.toString().padStart(2, '0');
+    document.getElementById('amigos-minutes').textContent = minutes.toString().padStart(2, '0');
+    document.getElementById('amigos-seconds').textContent = seconds.toString().padStart(2, '0');
+}
+
+// Rating System
+const amigosStars = document.querySelectorAll('.amigos-star');
+amigosStars.forEach(star => {
+    star.addEventListener('click', function() {
+        const rating = this.getAttribute('data-rating');
+        document.getElementById('amigosRating').value = rating;
+        document.getElementById('amigosRatingText').textContent = 
+            rating + ' star' + (rating > 1 ? 's' : '');
+        
+        amigosStars.forEach(s => {
+            s.textContent = '☆';
+            s.classList.remove('active');
+        });
+        
+        for (let i = 0; i < rating; i++) {
+            amigosStars[i].textContent = '⭐';
+            amigosStars[i].classList.add('active');
+        }
+    });
+});
+
+function submitAmigosRating() {
+    const rating = document.getElementById('amigosRating').value;
+    const voteId = document.getElementById('amigosVoteId').value;
+    
+    if (rating === '0') {
+        alert('Please select a rating by clicking on the stars!');
+        return;
+    }
+
+    const formData = new FormData();
+    formData.append('vote_id', voteId);
+    formData.append('score', rating);
+    formData.append('csrfmiddlewaretoken', document.body.dataset.csrfToken);
+
+    fetch('/votes/submit_rating/', {
+        method: 'POST',
+        body: formData,
+        headers: {'X-Requested-With': 'XMLHttpRequest'}
+    })
+    .then(res => res.json())
+    .then(data => {
+        if (data.success) {
+            document.getElementById('amigosPopup').style.display = 'none';
+            location.reload();
+        } else {
+            alert('Error: ' + data.error);
+        }
+    })
+    .catch(() => alert('Error submitting rating'));
+}
+
+// Initialize countdown
+updateAmigosCountdown();
+setInterval(updateAmigosCountdown, 1000);
+
+// Live updates instead of reloading every minute
+let amigosRetryDelay = 1000;
+
+function connectAmigosSocket() {
+    const scheme = location.protocol === 'https:' ? 'wss://' : 'ws://';
+    const socket = new WebSocket(scheme + location.host + '/ws/votes/');
+
+    socket.onopen = () => { amigosRetryDelay = 1000; };
+    socket.onmessage = (message) => {
+        const data = JSON.parse(message.data);
+        if (data.event === 'rotation_started') {
+            nextRotation = new Date(data.next_interval);
+            location.reload();
+        } else if (data.event === 'assignments_changed' || data.event === 'vote_to_rate') {
+            // Spread reloads out so a signup doesn't stampede the server
+            setTimeout(() => location.reload(), Math.random() * 3000);
+        }
+    };
+    socket.onclose = () => {
+        setTimeout(connectAmigosSocket, amigosRetryDelay);
+        amigosRetryDelay = Math.min(amigosRetryDelay * 2, 60000);
+    };
+}
+
+connectAmigosSocket();
@@ -1,35 +1,105 @@
 from django.contrib import admin
-from .models import Profile, Assignment, Vote, Rating
+from django.core.paginator import Paginator
+from django.db import connections, router
+from django.db.models import Case, F, FloatField, Max, Min, When
+from django.db.models.functions import Cast
+from django.utils.functional import cached_property
+
+from .models import Community, Profile, Assignment, Vote, Rating
+
+
+def estimate_rows(model):
+    """Rough row count of ``model``'s table without scanning it, or None."""
+    connection = connections[router.db_for_read(model)]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+            row = cursor.fetchone()
+        # -1/0 until the table has been analyzed
+        if row and row[0] > 0:
+            return row[0]
+    # Both ends of the primary key index; close enough when rows are rarely deleted
+    # except from the old end (see votes/archive.py)
+    bounds = model._base_manager.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return 0
+    return bounds['high'] - bounds['low'] + 1
+
+
+class EstimatedCountPaginator(Paginator):
+    """Skips COUNT(*) on unfiltered changelists, which is a full scan of millions of rows."""
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None or query.where:
+            # Filters and searches narrow the rows down, count them for real
+            return super().count
+        return estimate_rows(self.object_list.model)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+@admin.register(Community)
+class CommunityAdmin(admin.ModelAdmin):
+    list_display = ('name', 'created_at')
+    search_fields = ('name',)
 
 @admin.register(Profile)
-class ProfileAdmin(admin.ModelAdmin):
-    list_display = ('user', 'is_bestie', 'average_rating', 'total_ratings', 'date_joined')
-    list_filter = ('is_bestie', 'date_joined')
+class ProfileAdmin(LargeTableAdmin):
+    list_display = ('user', 'community', 'is_bestie', 'average_rating', 'total_ratings', 'date_joined')
+    list_filter = ('community', 'is_bestie', 'date_joined')
     search_fields = ('user__username', 'bio')
-    readonly_fields = ('average_rating', 'total_ratings')
+    readonly_fields = ('average_rating', 'total_ratings', 'rating_sum', 'rating_count')
+    list_select_related = ('user', 'community')
+    autocomplete_fields = ('user', 'community')
+
+    def get_queryset(self, request):
+        # Sortable columns computed from the running totals, not from Rating
+        return super().get_queryset(request).annotate(
+            rating_average=Case(
+                When(rating_count__gt=0, then=Cast(F('rating_sum'), FloatField()) / F('rating_count')),
+                default=0.0,
+                output_field=FloatField(),
+            ),
+        )
 
+    @admin.display(description='Avg Rating', ordering='rating_average')
     def average_rating(self, obj):
         return obj.average_rating
-    average_rating.short_description = 'Avg Rating'
 
+    @admin.display(description='Total Ratings', ordering='rating_count')
     def total_ratings(self, obj):
         return obj.total_ratings
-    total_ratings.short_description = 'Total Ratings'
 
 @admin.register(Assignment)
-class AssignmentAdmin(admin.ModelAdmin):
-    list_display = ('user', 'assigned_to', 'hour_interval', 'is_active')
-    list_filter = ('hour_interval', 'is_active')
+class AssignmentAdmin(LargeTableAdmin):
+    list_display = ('user', 'assigned_to', 'community', 'hour_interval', 'is_active')
+    list_filter = ('is_active', 'community')
+    date_hierarchy = 'hour_interval'
     search_fields = ('user__username', 'assigned_to__username')
+    list_select_related = ('user', 'assigned_to', 'community')
+    autocomplete_fields = ('user', 'assigned_to', 'community')
 
 @admin.register(Vote)
-class VoteAdmin(admin.ModelAdmin):
-    list_display = ('voter', 'recipient', 'hour_interval', 'timestamp')
-    list_filter = ('hour_interval', 'timestamp')
+class VoteAdmin(LargeTableAdmin):
+    list_display = ('voter', 'recipient', 'hour_interval', 'timestamp', 'awaiting_rating')
+    list_filter = ('awaiting_rating',)
+    date_hierarchy = 'hour_interval'
     search_fields = ('voter__username', 'recipient__username')
+    list_select_related = ('voter', 'recipient')
+    autocomplete_fields = ('voter', 'recipient')
+    raw_id_fields = ('assignment',)
 
 @admin.register(Rating)
-class RatingAdmin(admin.ModelAdmin):
+class RatingAdmin(LargeTableAdmin):
     list_display = ('rater', 'rated_user', 'score', 'vote', 'rated_at')
-    list_filter = ('score', 'rated_at')
-    search_fields = ('rater__username', 'rated_user__username')
\ No newline at end of file
+    list_filter = ('score',)
+    date_hierarchy = 'rated_at'
+    search_fields = ('rater__username', 'rated_user__username')
+    list_select_related = ('rater', 'rated_user', 'vote__voter', 'vote__recipient')
+    autocomplete_fields = ('rater', 'rated_user')
+    raw_id_fields = ('vote',)
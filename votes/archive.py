@@ -0,0 +1,107 @@
+"""
+Archival of closed intervals.
+
+``Assignment``, ``Vote`` and ``Rating`` gain 2N+ rows a week. Once an
+interval is older than ``settings.VOTES_ARCHIVE_AFTER_WEEKS`` nothing
+reads it row by row any more, so ``archive_interval()`` copies it into two
+compact, foreign-key-free tables (``ArchivedVote``: one row per
+assignment/vote pair, ``ArchivedRating``) and deletes the hot rows.
+
+Profile rating totals are left alone: archived ratings still count, and
+``rebuild_rating_totals`` and the weekly snapshots read both tables. Each
+interval is archived in its own transaction, oldest first, so
+``manage.py archive_intervals`` can be stopped and rerun at any time.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+
+from .models import ArchivedRating, ArchivedVote, Assignment, Rating, Vote
+from .writes import write_transaction
+
+BATCH_SIZE = 2000
+
+
+def archive_horizon():
+    """Weeks an interval stays in the hot tables; never less than the builder's history window."""
+    weeks = getattr(settings, 'VOTES_ARCHIVE_AFTER_WEEKS', 26)
+    avoid_recent = getattr(settings, 'VOTES_ROTATION', {}).get('avoid_recent_weeks', 0)
+    return max(weeks, avoid_recent + 1)
+
+
+def archive_cutoff(now):
+    """Intervals starting before this are archived."""
+    return now - timedelta(weeks=archive_horizon())
+
+
+def intervals_due(now):
+    """Every interval past the horizon still in the hot tables, oldest first (a DISTINCT over them)."""
+    return (
+        Assignment.objects.filter(hour_interval__lt=archive_cutoff(now))
+        .order_by('hour_interval').values_list('hour_interval', flat=True).distinct()
+    )
+
+
+def archivable_intervals(before):
+    """Intervals older than ``before`` that still have rows in the hot tables, oldest first."""
+    previous = None
+    while True:
+        interval = (
+            Assignment.objects.filter(hour_interval__lt=before)
+            .order_by('hour_interval').values_list('hour_interval', flat=True).first()
+        )
+        # Each yielded interval is expected to be gone before the next lookup
+        if interval is None or interval == previous:
+            return
+        yield interval
+        previous = interval
+
+
+def archive_interval(interval):
+    """Move ``interval`` into the archive tables. Returns ``(votes, ratings)`` archived."""
+    with write_transaction():
+        votes = Vote.objects.filter(hour_interval=interval).order_by('id').values_list('voter_id', 'recipient_id')
+        archived_votes = _copy(ArchivedVote, (
+            ArchivedVote(hour_interval=interval, voter_id=voter_id, recipient_id=recipient_id)
+            for voter_id, recipient_id in votes.iterator(chunk_size=BATCH_SIZE)
+        ))
+
+        ratings = Rating.objects.filter(vote__hour_interval=interval).order_by('id').values_list(
+            'rater_id', 'rated_user_id', 'score', 'rated_at'
+        )
+        archived_ratings = _copy(ArchivedRating, (
+            ArchivedRating(hour_interval=interval, rater_id=rater_id, rated_user_id=rated_user_id,
+                           score=score, rated_at=rated_at)
+            for rater_id, rated_user_id, score, rated_at in ratings.iterator(chunk_size=BATCH_SIZE)
+        ))
+
+        # Leaves first, so the cascades from votes and assignments find nothing left
+        Rating.objects.filter(vote__hour_interval=interval).delete()
+        Vote.objects.filter(hour_interval=interval).delete()
+        Assignment.objects.filter(hour_interval=interval).delete()
+    return archived_votes, archived_ratings
+
+
+def archive(now, limit=None):
+    """Archive up to ``limit`` intervals past the horizon; yields ``(interval, votes, ratings)``."""
+    for number, interval in enumerate(archivable_intervals(archive_cutoff(now))):
+        if limit is not None and number >= limit:
+            return
+        yield (interval, *archive_interval(interval))
+
+
+def _copy(model, objs):
+    """``bulk_create`` an iterable of ``model`` rows in batches; returns how many were written."""
+    written = 0
+    batch = []
+    for obj in objs:
+        batch.append(obj)
+        if len(batch) == BATCH_SIZE:
+            model.objects.bulk_create(batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+        written += len(batch)
+    return written
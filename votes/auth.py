@@ -0,0 +1,71 @@
+"""
+Cached users and profiles.
+
+``AuthenticationMiddleware`` loads the user on every logged-in request, and
+the votes page loads their profile; with the page reloading every minute in
+every open tab those are the same two rows over and over. ``CachedModelBackend``
+(users) and ``votes.profiles.get_profile`` (profiles) read them through the
+cache alias ``settings.VOTES_ACCOUNT_CACHE`` and keep them for
+``settings.VOTES_ACCOUNT_CACHE_TIMEOUT`` seconds. Within a request the user
+object carries its profile, so it is read at most once.
+
+Saves and deletes invalidate them (signal receivers in ``votes/models.py``).
+Queryset ``update()``s send no signals, so code that updates profiles that
+way (the rating totals in ``votes/ratings.py``) calls ``forget_profiles()``
+itself. The timeout bounds anything else: an admin bulk action, or another
+process's local-memory cache when no shared cache is configured. Users are
+only cached in a shared cache (file or Redis): a password change or
+deactivation must reach every process at once, not after the timeout.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import transaction
+
+from .board import is_process_local
+
+
+def account_cache():
+    return caches[getattr(settings, 'VOTES_ACCOUNT_CACHE', 'default')]
+
+
+def account_cache_timeout():
+    return getattr(settings, 'VOTES_ACCOUNT_CACHE_TIMEOUT', 300)
+
+
+def user_key(user_id):
+    return f'votes:user:{user_id}'
+
+
+def forget(keys):
+    """Drop ``keys`` now and again once the current transaction commits."""
+    keys = list(keys)
+    account_cache().delete_many(keys)
+    # A request that read the old row before the commit may have cached it again
+    transaction.on_commit(lambda: account_cache().delete_many(keys))
+
+
+def forget_user(user_id):
+    forget([user_key(user_id)])
+
+
+class CachedModelBackend(ModelBackend):
+    """``ModelBackend`` whose ``get_user()``, run on every authenticated request, reads through the cache."""
+
+    def get_user(self, user_id):
+        cache = account_cache()
+        if is_process_local(cache):
+            # Other processes' invalidations would never reach it
+            return super().get_user(user_id)
+        key = user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            UserModel = get_user_model()
+            try:
+                user = UserModel._default_manager.get(pk=user_id)
+            except UserModel.DoesNotExist:
+                return None
+            cache.set(key, user, account_cache_timeout())
+        return user if self.user_can_authenticate(user) else None
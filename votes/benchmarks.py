@@ -0,0 +1,113 @@
+"""
+Helpers shared by the benchmark commands.
+
+Benchmarks never touch the configured database: ``benchmark_database()``
+creates a throwaway one (a temporary file for SQLite, ``test_<name>``
+elsewhere), migrates it, and drops it afterwards.
+"""
+
+import math
+import os
+import random
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .board import get_cache
+from .models import Profile, Rating, Vote
+from .rotation import get_current_interval, rotate
+
+
+@contextmanager
+def benchmark_database(options=None, using=DEFAULT_DB_ALIAS):
+    """
+    Swap ``using`` for a fresh, migrated database for the duration of the block.
+
+    ``options`` replaces the connection OPTIONS, e.g. to compare SQLite
+    settings against each other.
+    """
+    connection = connections[using]
+    settings_dict = connection.settings_dict
+    saved = {key: settings_dict.get(key) for key in ('OPTIONS', 'TEST')}
+    tmpdir = None
+
+    if connection.vendor == 'sqlite':
+        # A real file: in-memory databases can't be shared between threads
+        tmpdir = tempfile.mkdtemp(prefix='amiga-bench-')
+        settings_dict['TEST'] = {**(settings_dict.get('TEST') or {}), 'NAME': os.path.join(tmpdir, 'bench.sqlite3')}
+    if options is not None:
+        settings_dict['OPTIONS'] = options
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    # Boards cached for another database would be served as hits
+    get_cache().clear()
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        settings_dict.update(saved)
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def seed(users, weeks, rated_fraction=0.8, batch_size=2000):
+    """
+    Fill the database with ``users`` users and ``weeks`` past rotations.
+
+    Roughly ``rated_fraction`` of past votes get a rating; the current
+    interval is rotated last. Returns the current interval.
+    """
+    User.objects.bulk_create(
+        (User(username=f'bench{i}', password='!') for i in range(users)),
+        batch_size=batch_size,
+    )
+    current = get_current_interval()
+    for week in range(weeks, 0, -1):
+        rotate(current - timedelta(weeks=week))
+
+    rng = random.Random(0)
+    ratings = []
+    rated_votes = []
+    for vote_id, voter_id, recipient_id in Vote.objects.values_list('id', 'voter_id', 'recipient_id').iterator():
+        if rng.random() < rated_fraction:
+            ratings.append(Rating(rater_id=recipient_id, rated_user_id=voter_id, vote_id=vote_id, score=rng.randint(1, 5)))
+            rated_votes.append(vote_id)
+    Rating.objects.bulk_create(ratings, batch_size=batch_size)
+    for start in range(0, len(rated_votes), batch_size):
+        Vote.objects.filter(id__in=rated_votes[start:start + batch_size]).update(awaiting_rating=False)
+
+    totals = {}
+    for rating in ratings:
+        rating_sum, rating_count = totals.get(rating.rated_user_id, (0, 0))
+        totals[rating.rated_user_id] = (rating_sum + rating.score, rating_count + 1)
+    profiles = list(Profile.objects.filter(user_id__in=totals))
+    for profile in profiles:
+        profile.rating_sum, profile.rating_count = totals[profile.user_id]
+    Profile.objects.bulk_update(profiles, ['rating_sum', 'rating_count'], batch_size=batch_size)
+
+    rotate(current)
+    return current
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of ``samples`` (0 for an empty list)."""
+    if not samples:
+        return 0
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(samples):
+    """p50/p95/p99/max of latencies in seconds, reported in milliseconds."""
+    return {
+        'count': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 2),
+        'p95_ms': round(percentile(samples, 95) * 1000, 2),
+        'p99_ms': round(percentile(samples, 99) * 1000, 2),
+        'max_ms': round(max(samples, default=0) * 1000, 2),
+    }
@@ -0,0 +1,180 @@
+"""
+Cached read model for the weekly assignment board.
+
+The board is the same for everyone in a group (see ``votes.rotation``) and
+interval, so it is serialized once and stored in the cache under the
+interval, the group and a board version. Anything
+that changes assignments or rating totals calls ``bump_version()``, which
+makes every cached board stale at once without having to find and delete
+the keys.
+
+The cache alias comes from ``settings.VOTES_BOARD_CACHE`` (local memory by
+default, see ``CACHES`` in settings for file/Redis). A local-memory cache
+only sees its own process's bumps, not those of other web workers or of
+management commands (``rotate --force``, ``rebuild_rating_totals``,
+``archive_intervals``), so boards there expire after ``LOCAL_BOARD_TIMEOUT``
+instead of lasting the whole interval. ``aget_version`` and
+``aget_board`` are the same reads for async views. The rendered board on
+the votes page is cached in the same place, under the same version (the
+``{% cache %}`` block in ``votes/index.html``).
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from .models import Assignment
+
+VERSION_KEY = 'votes:board:version'
+HITS_KEY = 'votes:board:hits'
+MISSES_KEY = 'votes:board:misses'
+BOARD_TIMEOUT = 8 * 24 * 3600  # a little over one interval
+LOCAL_BOARD_TIMEOUT = 60  # bounds how long another process's changes go unseen
+
+
+def board_cache_alias():
+    return getattr(settings, 'VOTES_BOARD_CACHE', 'default')
+
+
+def get_cache():
+    return caches[board_cache_alias()]
+
+
+def is_process_local(cache):
+    """True if ``cache`` lives in this process only, so other processes' writes never reach it."""
+    return isinstance(cache, LocMemCache)
+
+
+def board_timeout():
+    """How long a board (or its rendered fragment) stays cached."""
+    return LOCAL_BOARD_TIMEOUT if is_process_local(get_cache()) else BOARD_TIMEOUT
+
+
+def get_version():
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock so a lost key never reuses an old version
+        cache.add(VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def aget_version():
+    cache = get_cache()
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    """Invalidate every cached board once the current transaction commits."""
+    transaction.on_commit(_bump)
+
+
+def _bump():
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        get_version()
+
+
+def get_board(interval, community_id=None):
+    """
+    A group's board for the interval as a list of row dicts, ordered like the database.
+
+    Each row has ``id``, ``user_id``, ``username``, ``assigned_to_id``,
+    ``assigned_to``, ``average_rating`` and ``total_ratings``.
+    """
+    cache = get_cache()
+    key = _board_key(interval, community_id, get_version())
+    rows = cache.get(key)
+    if rows is not None:
+        _count(HITS_KEY)
+        return rows
+
+    _count(MISSES_KEY)
+    rows = build_board(interval, community_id)
+    cache.set(key, rows, board_timeout())
+    return rows
+
+
+async def aget_board(interval, community_id=None):
+    """``get_board`` for async views; a miss is built with async iteration."""
+    cache = get_cache()
+    key = _board_key(interval, community_id, await aget_version())
+    rows = await cache.aget(key)
+    if rows is not None:
+        await _acount(HITS_KEY)
+        return rows
+
+    await _acount(MISSES_KEY)
+    rows = [_board_row(*values) async for values in board_queryset(interval, community_id)]
+    await cache.aset(key, rows, board_timeout())
+    return rows
+
+
+def _board_key(interval, community_id, version):
+    return f'votes:board:{interval:%Y%m%d%H%M}:{community_id or "default"}:{version}'
+
+
+def board_queryset(interval, community_id=None):
+    return Assignment.objects.filter(
+        hour_interval=interval, community_id=community_id, is_active=True
+    ).order_by('id').values_list(
+        'id', 'user_id', 'user__username', 'assigned_to_id', 'assigned_to__username',
+        'user__profile__rating_sum', 'user__profile__rating_count',
+    )
+
+
+def build_board(interval, community_id=None):
+    return [_board_row(*values) for values in board_queryset(interval, community_id)]
+
+
+def _board_row(assignment_id, user_id, username, assigned_to_id, assigned_to, rating_sum, rating_count):
+    return {
+        'id': assignment_id,
+        'user_id': user_id,
+        'username': username,
+        'assigned_to_id': assigned_to_id,
+        'assigned_to': assigned_to,
+        'average_rating': round(rating_sum / rating_count, 1) if rating_count else 0,
+        'total_ratings': rating_count or 0,
+    }
+
+
+def cache_stats():
+    cache = get_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {
+        'version': get_version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / lookups, 3) if lookups else None,
+    }
+
+
+def _count(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+async def _acount(key):
+    cache = get_cache()
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 0, timeout=None)
+        await cache.aincr(key)
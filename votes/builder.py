@@ -0,0 +1,212 @@
+"""
+Set-based assignment builder.
+
+Works on arrays of user ids instead of model instances: the pairing is
+computed with NumPy, checked against the constraints in bulk, repaired with
+a handful of swaps, and written with ``bulk_create`` in batches.
+
+Strategies:
+
+``ring``
+    One circle through everybody (user1 -> user2 -> ... -> user1). This is
+    what the app has always done.
+``derangement``
+    A random permutation with no fixed points; it may split into several
+    smaller circles.
+
+Constraints:
+
+``avoid_recent_weeks``
+    Don't repeat a pairing used in the last N intervals.
+``avoid_reciprocal``
+    Don't assign you to the person who drew you.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+import numpy as np
+
+from .models import Assignment, Vote
+
+logger = logging.getLogger(__name__)
+
+
+class RingStrategy:
+    name = 'ring'
+
+    def initial(self, user_ids, rng):
+        return rng.permutation(user_ids)
+
+    def edges(self, user_ids, state):
+        return state, np.roll(state, -1)
+
+    def slot(self, position, size):
+        # Edge i is state[i] -> state[i + 1]; moving the receiver keeps one circle
+        return (position + 1) % size
+
+
+class DerangementStrategy:
+    name = 'derangement'
+
+    def initial(self, user_ids, rng):
+        return rng.permutation(user_ids)
+
+    def edges(self, user_ids, state):
+        return user_ids, state
+
+    def slot(self, position, size):
+        return position
+
+
+STRATEGIES = {strategy.name: strategy for strategy in (RingStrategy(), DerangementStrategy())}
+
+
+class BuildStats:
+    """Timings and counters for one build, in seconds."""
+
+    def __init__(self):
+        self.users = 0
+        self.rows_written = 0
+        self.repair_rounds = 0
+        self.unresolved = 0
+        self.history_seconds = 0.0
+        self.shuffle_seconds = 0.0
+        self.constraint_seconds = 0.0
+        self.write_seconds = 0.0
+
+    @property
+    def total_seconds(self):
+        return self.history_seconds + self.shuffle_seconds + self.constraint_seconds + self.write_seconds
+
+    def as_dict(self):
+        return {
+            'users': self.users,
+            'rows_written': self.rows_written,
+            'repair_rounds': self.repair_rounds,
+            'unresolved': self.unresolved,
+            'history_seconds': round(self.history_seconds, 4),
+            'shuffle_seconds': round(self.shuffle_seconds, 4),
+            'constraint_seconds': round(self.constraint_seconds, 4),
+            'write_seconds': round(self.write_seconds, 4),
+            'total_seconds': round(self.total_seconds, 4),
+        }
+
+    def __str__(self):
+        return ', '.join(f'{key}={value}' for key, value in self.as_dict().items())
+
+
+class AssignmentBuilder:
+    def __init__(self, strategy='ring', avoid_recent_weeks=0, avoid_reciprocal=False,
+                 batch_size=1000, max_rounds=50, seed=None):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy {strategy!r}, expected one of {sorted(STRATEGIES)}")
+        self.strategy = STRATEGIES[strategy]
+        self.avoid_recent_weeks = avoid_recent_weeks
+        self.avoid_reciprocal = avoid_reciprocal
+        self.batch_size = batch_size
+        self.max_rounds = max_rounds
+        self.rng = np.random.default_rng(seed)
+        self.stats = BuildStats()
+
+    def run(self, interval, user_ids, community_id=None):
+        """Pair ``user_ids`` for ``interval`` and write the assignments and votes of their group."""
+        self.stats = BuildStats()
+        history = self.load_history(interval, community_id)
+        givers, receivers = self.build(user_ids, history)
+        self.write(interval, givers, receivers, community_id)
+        return self.stats
+
+    def load_history(self, interval, community_id=None):
+        """The group's pairings from the previous ``avoid_recent_weeks`` intervals as a (k, 2) array."""
+        started = time.perf_counter()
+        pairs = np.empty((0, 2), dtype=np.int64)
+        if self.avoid_recent_weeks:
+            rows = Assignment.objects.filter(
+                hour_interval__gte=interval - timedelta(weeks=self.avoid_recent_weeks),
+                hour_interval__lt=interval,
+                community_id=community_id,
+            ).values_list('user_id', 'assigned_to_id')
+            pairs = np.array(list(rows), dtype=np.int64).reshape(-1, 2)
+        self.stats.history_seconds += time.perf_counter() - started
+        return pairs
+
+    def build(self, user_ids, history=None):
+        """Return ``(givers, receivers)`` arrays satisfying the constraints where possible."""
+        user_ids = np.unique(np.asarray(user_ids, dtype=np.int64))
+        size = len(user_ids)
+        self.stats.users = size
+        if size <= 1:
+            # A lone user is paired with themselves
+            return user_ids, user_ids.copy()
+
+        started = time.perf_counter()
+        state = self.strategy.initial(user_ids, self.rng)
+        self.stats.shuffle_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        forbidden = self._forbidden_keys(history, user_ids)
+        best, best_count = state.copy(), None
+        for round_number in range(self.max_rounds + 1):
+            bad = self._violations(user_ids, state, forbidden)
+            if best_count is None or len(bad) < best_count:
+                best, best_count = state.copy(), len(bad)
+            if not len(bad):
+                break
+            self.stats.repair_rounds = round_number + 1
+            # Few edges break a constraint, so fix them one swap at a time
+            for position in bad:
+                slot = self.strategy.slot(int(position), size)
+                other = int(self.rng.integers(size))
+                state[slot], state[other] = state[other], state[slot]
+        self.stats.unresolved = best_count
+        self.stats.constraint_seconds += time.perf_counter() - started
+
+        if best_count:
+            logger.warning("Assignment builder left %d pairing(s) violating constraints", best_count)
+        return self.strategy.edges(user_ids, best)
+
+    def write(self, interval, givers, receivers, community_id=None):
+        started = time.perf_counter()
+        givers, receivers = givers.tolist(), receivers.tolist()
+        Assignment.objects.bulk_create(
+            (Assignment(user_id=giver, assigned_to_id=receiver, hour_interval=interval, is_active=True,
+                        community_id=community_id)
+             for giver, receiver in zip(givers, receivers)),
+            batch_size=self.batch_size,
+        )
+        # Read ids back rather than relying on the backend returning them from bulk_create
+        assignment_ids = dict(
+            Assignment.objects.filter(hour_interval=interval, community_id=community_id)
+            .values_list('user_id', 'id')
+        )
+        Vote.objects.bulk_create(
+            (Vote(voter_id=giver, recipient_id=receiver, assignment_id=assignment_ids[giver], hour_interval=interval)
+             for giver, receiver in zip(givers, receivers)),
+            batch_size=self.batch_size,
+        )
+        self.stats.rows_written += 2 * len(givers)
+        self.stats.write_seconds += time.perf_counter() - started
+
+    def _forbidden_keys(self, history, user_ids):
+        if history is None or not len(history):
+            return None
+        base = int(max(user_ids.max(), history.max())) + 1
+        return np.unique(history[:, 0] * base + history[:, 1]), base
+
+    def _violations(self, user_ids, state, forbidden):
+        givers, receivers = self.strategy.edges(user_ids, state)
+        bad = givers == receivers
+
+        if forbidden is not None:
+            keys, base = forbidden
+            bad |= np.isin(givers * base + receivers, keys)
+
+        if self.avoid_reciprocal and len(user_ids) > 2:
+            order = np.argsort(givers)
+            receiver_of = receivers[order]
+            drawn_by_receiver = receiver_of[np.searchsorted(givers[order], receivers)]
+            bad |= drawn_by_receiver == givers
+
+        return np.flatnonzero(bad)
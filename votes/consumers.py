@@ -0,0 +1,27 @@
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .events import ROTATION_GROUP, board_group, user_group
+from .profiles import aget_profile
+
+
+class BoardConsumer(AsyncJsonWebsocketConsumer):
+    """Live updates for the votes page: rotations, board changes and rating prompts."""
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+
+        profile = await aget_profile(user)
+        self.subscriptions = [ROTATION_GROUP, board_group(profile.community_id), user_group(user.id)]
+        for group in self.subscriptions:
+            await self.channel_layer.group_add(group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        for group in getattr(self, 'subscriptions', []):
+            await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def votes_event(self, event):
+        await self.send_json(event['payload'])
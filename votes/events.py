@@ -0,0 +1,58 @@
+"""
+Push notifications for open pages, sent over the Channels layer.
+
+Every connected page listens on the rotation group, on its community's
+board group and on its own user group (see ``votes.consumers``). Events are sent after the surrounding
+transaction commits so clients never reload into half-written data.
+"""
+
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+# A rotation covers every community, so every page hears about it
+ROTATION_GROUP = 'votes-rotation'
+
+
+def board_group(community_id):
+    return f'votes-board-{community_id or "default"}'
+
+
+def user_group(user_id):
+    return f'votes-user-{user_id}'
+
+
+def rotation_started(interval, next_interval):
+    _send(ROTATION_GROUP, 'rotation_started', {
+        'interval': interval.isoformat(),
+        'next_interval': next_interval.isoformat(),
+    })
+
+
+def assignments_changed(interval, community_id=None):
+    _send(board_group(community_id), 'assignments_changed', {'interval': interval.isoformat()})
+
+
+def votes_to_rate(user_ids):
+    for user_id in user_ids:
+        _send(user_group(user_id), 'vote_to_rate', {})
+
+
+def _send(group, event, payload):
+    message = {'type': 'votes.event', 'payload': {'event': event, **payload}}
+
+    def send():
+        layer = get_channel_layer()
+        if layer is None:
+            return
+        try:
+            async_to_sync(layer.group_send)(group, message)
+        except Exception:
+            # A dead channel layer must not break the request that triggered the event
+            logger.exception("Could not push %s event to %s", event, group)
+
+    transaction.on_commit(send)
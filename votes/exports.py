@@ -0,0 +1,110 @@
+"""
+Streaming exports of the voting history.
+
+Rows are read with ``values_list().iterator(chunk_size=...)`` and turned
+into text one line at a time, so exporting millions of rows keeps memory
+flat whether it goes to a file (``manage.py export_history``) or out
+through a ``StreamingHttpResponse`` (``/votes/export/<table>/``).
+
+Under ASGI a streaming response over a plain iterator is read into memory
+whole before anything is sent, so the views hand ASGI requests
+``astream()`` instead, which pulls the lines a batch at a time.
+"""
+
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from .models import Assignment, Rating, Vote
+
+CHUNK_SIZE = 2000
+
+# name -> (model, columns, date column used by the start/end filters)
+TABLES = {
+    'assignments': (
+        Assignment,
+        ('id', 'user_id', 'assigned_to_id', 'hour_interval', 'is_active'),
+        'hour_interval',
+    ),
+    'votes': (
+        Vote,
+        ('id', 'voter_id', 'recipient_id', 'assignment_id', 'hour_interval', 'timestamp', 'awaiting_rating'),
+        'hour_interval',
+    ),
+    'ratings': (
+        Rating,
+        ('id', 'rater_id', 'rated_user_id', 'vote_id', 'score', 'rated_at'),
+        'rated_at',
+    ),
+}
+
+FORMATS = ('csv', 'jsonl')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+def export_rows(table, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """``(columns, rows)`` for ``table``, optionally limited to ``start <= date < end``."""
+    model, columns, date_column = TABLES[table]
+    queryset = model.objects.all()
+    if start is not None:
+        queryset = queryset.filter(**{f'{date_column}__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{f'{date_column}__lt': end})
+    rows = queryset.order_by('id').values_list(*columns).iterator(chunk_size=chunk_size)
+    return columns, rows
+
+
+def csv_lines(columns, rows):
+    """A header line, then one CSV line per row."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def jsonl_lines(columns, rows):
+    """One JSON object per line."""
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), default=_isoformat) + '\n'
+
+
+def stream(table, fmt='csv', start=None, end=None, chunk_size=CHUNK_SIZE):
+    """Export ``table`` as lines of text in ``fmt`` (``csv`` or ``jsonl``)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {FORMATS}")
+    columns, rows = export_rows(table, start, end, chunk_size)
+    lines = csv_lines if fmt == 'csv' else jsonl_lines
+    return lines(columns, rows)
+
+
+async def astream(lines, batch_size=CHUNK_SIZE):
+    """
+    The lines of a synchronous iterator as an async iterator, ``batch_size`` lines per chunk.
+
+    Each batch is pulled through ``sync_to_async`` on the request's sync
+    thread, where the database cursor behind the lines stays open.
+    """
+    lines = iter(lines)
+    while batch := await sync_to_async(_take)(lines, batch_size):
+        yield ''.join(batch)
+
+
+def _take(iterator, count):
+    return list(islice(iterator, count))
+
+
+class _Echo:
+    """File-like object for csv.writer that hands each line back instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def _isoformat(value):
+    return value.isoformat()
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from votes.archive import archive, archive_horizon, intervals_due
+
+
+class Command(BaseCommand):
+    help = (
+        "Move intervals older than VOTES_ARCHIVE_AFTER_WEEKS into the compact archive tables. "
+        "Runs one interval per transaction, oldest first; safe to stop and rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help="Archive at most this many intervals in this run.",
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only list the intervals that would be archived.",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        if options['dry_run']:
+            for interval in intervals_due(now)[:options['limit']]:
+                self.stdout.write(f"{interval:%Y-%m-%d %H:%M}")
+            return
+
+        archived = 0
+        for interval, votes, ratings in archive(now, limit=options['limit']):
+            archived += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{interval:%Y-%m-%d %H:%M}: {votes} vote(s), {ratings} rating(s)")
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived} interval(s) older than {archive_horizon()} weeks"
+        ))
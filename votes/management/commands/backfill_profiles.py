@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from votes.profiles import ensure_profiles
+
+
+class Command(BaseCommand):
+    help = "Create the missing Profile rows for existing users, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        missing = User.objects.filter(profile__isnull=True).order_by('id').values_list('id', flat=True)
+        created = 0
+        batch = []
+        for user_id in missing.iterator(chunk_size=options['batch_size']):
+            batch.append(user_id)
+            if len(batch) >= options['batch_size']:
+                created += ensure_profiles(batch)
+                batch = []
+        if batch:
+            created += ensure_profiles(batch)
+        self.stdout.write(self.style.SUCCESS(f"Created {created} profile(s)"))
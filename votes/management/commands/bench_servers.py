@@ -0,0 +1,154 @@
+import asyncio
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+from votes.benchmarks import benchmark_database, seed, summarize
+
+# name -> (module that must be importable, command line, extra environment)
+SERVERS = {
+    'gunicorn': (
+        'gunicorn',
+        ['-m', 'gunicorn', 'amiga.wsgi:application', '--bind', '127.0.0.1:{port}',
+         '--workers', '1', '--threads', '{threads}', '--log-level', 'warning'],
+        {},
+    ),
+    'daphne': (
+        'daphne',
+        ['-m', 'daphne', '--bind', '127.0.0.1', '--port', '{port}', '-v', '0', 'amiga.asgi:application'],
+        {'CONN_MAX_AGE': '0'},
+    ),
+    'uvicorn': (
+        'uvicorn',
+        ['-m', 'uvicorn', 'amiga.asgi:application', '--host', '127.0.0.1', '--port', '{port}',
+         '--log-level', 'warning'],
+        {'CONN_MAX_AGE': '0'},
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a seeded benchmark database with each installed server (gunicorn/WSGI, "
+        "daphne and uvicorn/ASGI), one process each, and report throughput and latency "
+        "as the number of concurrent connections grows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='+', choices=sorted(SERVERS),
+                            help="Servers to compare (default: every one that is installed).")
+        parser.add_argument('--users', type=int, default=1000, help="Users to seed.")
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 200],
+                            help="Concurrent connections per round.")
+        parser.add_argument('--duration', type=float, default=5.0, help="Seconds per round.")
+        parser.add_argument('--path', default='/votes/get_assignments/', help="Page to request.")
+        parser.add_argument('--threads', type=int, default=8, help="gunicorn threads (its concurrency limit).")
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("bench_servers shares its database with the servers through SQLITE_PATH; SQLite only")
+
+        servers = options['servers'] or [name for name, (module, _, _) in SERVERS.items() if _installed(module)]
+        missing = [name for name in servers if not _installed(SERVERS[name][0])]
+        if missing:
+            raise CommandError(f"Not installed: {', '.join(missing)}")
+        if not servers:
+            raise CommandError("None of gunicorn, daphne or uvicorn is installed")
+
+        with benchmark_database():
+            seed(options['users'], weeks=2)
+            client = Client()
+            client.force_login(User.objects.order_by('id').first())
+            cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+            database = str(connection.settings_dict['NAME'])
+            connection.close()
+
+            for name in servers:
+                self.stdout.write(self.style.MIGRATE_HEADING(f"{name} ({options['users']} users, {options['path']})"))
+                with _Server(name, database, options) as port:
+                    for concurrency in options['concurrency']:
+                        stats = asyncio.run(load(port, options['path'], cookie, concurrency, options['duration']))
+                        self.stdout.write(
+                            f"  c={concurrency:<5} {stats['rps']:>8} req/s  p50={stats['p50_ms']}ms "
+                            f"p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms errors={stats['errors']}"
+                        )
+
+
+class _Server:
+    """Runs one server against the benchmark database for the duration of a ``with`` block."""
+
+    def __init__(self, name, database, options):
+        _, argv, extra_env = SERVERS[name]
+        self.port = options['port']
+        self.argv = [sys.executable] + [arg.format(port=self.port, threads=options['threads']) for arg in argv]
+        self.env = {**os.environ, **extra_env, 'SQLITE_PATH': database}
+        self.process = None
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.argv, env=self.env, cwd=settings.BASE_DIR)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError(f"{' '.join(self.argv)} exited with {self.process.returncode}")
+            try:
+                socket.create_connection(('127.0.0.1', self.port), timeout=0.5).close()
+                return self.port
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise CommandError(f"{' '.join(self.argv)} didn't start listening on port {self.port}")
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+async def load(port, path, cookie, concurrency, duration):
+    """``concurrency`` clients requesting ``path`` back to back for ``duration`` seconds."""
+    request = (
+        f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nCookie: {cookie}\r\n"
+        f"Connection: close\r\n\r\n"
+    ).encode()
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.write(request)
+                await writer.drain()
+                response = await reader.read()
+                writer.close()
+            except OSError:
+                errors += 1
+                continue
+            if response.startswith(b'HTTP/1.1 200'):
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    began = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - began
+    return {**summarize(latencies), 'rps': round(len(latencies) / elapsed, 1), 'errors': errors}
+
+
+def _installed(module):
+    return importlib.util.find_spec(module) is not None
@@ -0,0 +1,115 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from votes.benchmarks import benchmark_database, seed, summarize
+from votes.models import Vote
+
+PROFILES = {
+    'stock': {},
+    'tuned': settings.SQLITE_TUNED_OPTIONS,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer index and submit_rating from many threads against a throwaway SQLite "
+        "database and report lock errors and latency percentiles per SQLite profile."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', choices=[*PROFILES, 'both'], default='both')
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--weeks', type=int, default=4)
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=50, help="Requests per thread and endpoint.")
+
+    def handle(self, *args, **options):
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError("bench_sqlite only makes sense on the SQLite backend")
+
+        profiles = list(PROFILES) if options['profile'] == 'both' else [options['profile']]
+        setup_test_environment()
+        try:
+            for profile in profiles:
+                with benchmark_database(options=PROFILES[profile]):
+                    seed(options['users'], options['weeks'])
+                    results = self.hammer(options['threads'], options['requests'])
+                self.report(profile, results)
+        finally:
+            teardown_test_environment()
+
+    def hammer(self, threads, requests):
+        users = list(User.objects.values_list('id', flat=True))
+        votes_by_user = {}
+        for vote_id, recipient_id in Vote.objects.values_list('id', 'recipient_id'):
+            votes_by_user.setdefault(recipient_id, []).append(vote_id)
+
+        results = {'index': [], 'submit_rating': [], 'errors': 0, 'lock_errors': 0}
+        lock = threading.Lock()
+        start = threading.Barrier(threads)
+
+        def worker(seed_value):
+            rng = random.Random(seed_value)
+            user_id = rng.choice(users)
+            client = Client()
+            client.force_login(User.objects.get(pk=user_id))
+            timings = {'index': [], 'submit_rating': []}
+            errors = lock_errors = 0
+            start.wait()
+            for _ in range(requests):
+                calls = [
+                    ('index', lambda: client.get('/votes/')),
+                    ('submit_rating', lambda: client.post('/votes/submit_rating/', {
+                        'vote_id': rng.choice(votes_by_user.get(user_id, [0])),
+                        'score': rng.randint(1, 5),
+                    })),
+                ]
+                for name, call in calls:
+                    began = time.perf_counter()
+                    try:
+                        response = call()
+                        if response.status_code >= 500:
+                            errors += 1
+                    except OperationalError as exc:
+                        errors += 1
+                        if 'locked' in str(exc):
+                            lock_errors += 1
+                    timings[name].append(time.perf_counter() - began)
+            connections.close_all()
+            with lock:
+                for name, samples in timings.items():
+                    results[name].extend(samples)
+                results['errors'] += errors
+                results['lock_errors'] += lock_errors
+
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        began = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        results['elapsed'] = time.perf_counter() - began
+        return results
+
+    def report(self, profile, results):
+        total = len(results['index']) + len(results['submit_rating'])
+        self.stdout.write(self.style.MIGRATE_HEADING(f"SQLite profile: {profile}"))
+        self.stdout.write(
+            f"  {total} requests in {results['elapsed']:.2f}s "
+            f"({total / results['elapsed']:.0f} req/s), "
+            f"errors={results['errors']} lock_errors={results['lock_errors']}"
+        )
+        for name in ('index', 'submit_rating'):
+            stats = summarize(results[name])
+            self.stdout.write(
+                f"  {name:<14} p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms "
+                f"p99={stats['p99_ms']}ms max={stats['max_ms']}ms"
+            )
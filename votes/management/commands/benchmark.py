@@ -0,0 +1,137 @@
+import json
+import random
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from votes.benchmarks import benchmark_database, seed, summarize
+from votes.models import Vote
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'votes' / 'benchmark_baseline.json'
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class RowCounter:
+    """``execute_wrapper`` that adds up the rows touched by write statements."""
+
+    def __init__(self):
+        self.rows = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+        if sql.lstrip().upper().startswith(WRITE_STATEMENTS):
+            self.rows += max(context['cursor'].rowcount, 0)
+        return result
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed synthetic datasets, drive the voting views through the test client and "
+        "report latency percentiles, query counts and rows written per endpoint. "
+        "Fails if an endpoint needs more queries than the saved baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000],
+                            help="Dataset sizes in users, e.g. --sizes 1000 10000 100000.")
+        parser.add_argument('--weeks', type=int, default=8, help="Past weeks of votes and ratings to seed.")
+        parser.add_argument('--samples', type=int, default=30, help="Requests per endpoint.")
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--save-baseline', action='store_true',
+                            help="Write this run's query counts as the new baseline.")
+
+    def handle(self, *args, **options):
+        report = {}
+        setup_test_environment()
+        try:
+            for size in options['sizes']:
+                with benchmark_database():
+                    began = time.perf_counter()
+                    seed(size, options['weeks'])
+                    self.stdout.write(self.style.MIGRATE_HEADING(
+                        f"{size} users, {options['weeks']} weeks (seeded in {time.perf_counter() - began:.1f}s)"
+                    ))
+                    report[str(size)] = self.run_endpoints(options['samples'])
+                for endpoint, stats in report[str(size)].items():
+                    self.stdout.write(
+                        f"  {endpoint:<16} queries={stats['queries']:<3} rows_written={stats['rows_written']:<4} "
+                        f"p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms p99={stats['p99_ms']}ms"
+                    )
+        finally:
+            teardown_test_environment()
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            baseline = {
+                size: {endpoint: {'queries': stats['queries']} for endpoint, stats in endpoints.items()}
+                for size, endpoints in report.items()
+            }
+            baseline_path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {baseline_path}"))
+            return
+
+        if baseline_path.exists():
+            self.check_baseline(report, json.loads(baseline_path.read_text()))
+
+    def run_endpoints(self, samples):
+        rng = random.Random(0)
+        user_ids = list(User.objects.values_list('id', flat=True))
+        client = Client()
+
+        def login():
+            user = User.objects.get(pk=rng.choice(user_ids))
+            client.force_login(user)
+            return user
+
+        def rate():
+            user = login()
+            vote_id = Vote.objects.filter(recipient=user).values_list('id', flat=True).first()
+            return lambda: client.post('/votes/submit_rating/', {'vote_id': vote_id, 'score': rng.randint(1, 5)})
+
+        def register():
+            client.logout()
+            username = f'newcomer{rng.randrange(10 ** 9)}'
+            return lambda: client.post('/accounts/register/', {
+                'username': username, 'password1': 'bench-Pa55word', 'password2': 'bench-Pa55word',
+            })
+
+        endpoints = {
+            'index': lambda: (login(), lambda: client.get('/votes/'))[1],
+            'get_assignments': lambda: (login(), lambda: client.get('/votes/get_assignments/'))[1],
+            'submit_rating': rate,
+            'register': register,
+        }
+
+        results = {}
+        for name, prepare in endpoints.items():
+            timings, queries, rows = [], 0, 0
+            for _ in range(samples):
+                request = prepare()
+                counter = RowCounter()
+                with CaptureQueriesContext(connection) as captured, connection.execute_wrapper(counter):
+                    began = time.perf_counter()
+                    response = request()
+                    timings.append(time.perf_counter() - began)
+                if response.status_code >= 400:
+                    raise CommandError(f"{name} returned {response.status_code}")
+                queries = max(queries, len(captured))
+                rows = max(rows, counter.rows)
+            results[name] = {'queries': queries, 'rows_written': rows, **summarize(timings)}
+        return results
+
+    def check_baseline(self, report, baseline):
+        regressions = []
+        for size, endpoints in report.items():
+            for endpoint, stats in endpoints.items():
+                expected = baseline.get(size, {}).get(endpoint, {}).get('queries')
+                if expected is not None and stats['queries'] > expected:
+                    regressions.append(f"{endpoint} @ {size} users: {stats['queries']} queries (baseline {expected})")
+        if regressions:
+            raise CommandError("Query count regressions:\n  " + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS("Query counts within baseline"))
@@ -0,0 +1,50 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from votes.writes import write_transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired sessions from the session table in batches, one short transaction each, "
+        "so other writers aren't locked out the way one big clearsessions DELETE would."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Sessions deleted per transaction.")
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.0,
+            help="Seconds to wait between batches, to leave room for other writers.",
+        )
+
+    def handle(self, *args, **options):
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        if not hasattr(store, 'get_model_class'):
+            self.stdout.write(f"{settings.SESSION_ENGINE} keeps no session table; nothing to clear")
+            return
+        Session = store.get_model_class()
+
+        # Cached copies (cached_db) expire from the cache on their own
+        now = timezone.now()
+        deleted = 0
+        while True:
+            with write_transaction():
+                keys = list(
+                    Session.objects.filter(expire_date__lt=now)
+                    .values_list('session_key', flat=True)[:options['batch_size']]
+                )
+                if keys:
+                    Session.objects.filter(session_key__in=keys).delete()
+            deleted += len(keys)
+            if options['verbosity'] > 1 and keys:
+                self.stdout.write(f"{deleted} deleted")
+            if len(keys) < options['batch_size']:
+                break
+            time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired session(s)"))
@@ -0,0 +1,65 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from votes.transfer import (
+    MODELS, RowCountMismatch, copy_tables, row_counts, sqlite_source, unapplied_migrations, unmatched_permissions,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy users, groups and permissions, communities, profiles, rotations, assignments, votes, ratings, snapshots and archives "
+        "from a SQLite file into the PostgreSQL database set by DATABASE_URL, using COPY. "
+        "Resets the id sequences and checks the row counts afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sqlite',
+            default=settings.SQLITE_PATH,
+            help="SQLite file to read (default: SQLITE_PATH or db.sqlite3).",
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help="PostgreSQL connection to copy into.",
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Rows fetched from SQLite at a time.")
+
+    def handle(self, *args, **options):
+        target = options['database']
+        if connections[target].vendor != 'postgresql':
+            raise CommandError(f"'{target}' is {connections[target].vendor}, not PostgreSQL; set DATABASE_URL")
+
+        with sqlite_source(options['sqlite']) as source:
+            if unapplied := unapplied_migrations(source.alias):
+                raise CommandError(
+                    f"{options['sqlite']} is missing migrations ({', '.join(unapplied)}); "
+                    f"run `SQLITE_PATH={options['sqlite']} manage.py migrate` without DATABASE_URL first"
+                )
+            if unapplied := unapplied_migrations(target):
+                raise CommandError(f"Run manage.py migrate first ({len(unapplied)} migration(s) unapplied)")
+            if nonempty := [label for label, rows in row_counts(target).items() if rows]:
+                raise CommandError(f"The target already has data in {', '.join(nonempty)}")
+            if missing := unmatched_permissions(source.alias, target):
+                raise CommandError(
+                    f"The target has no permission {', '.join(missing)}; "
+                    f"install the same apps there and run manage.py migrate"
+                )
+
+            started = time.perf_counter()
+            copied = 0
+            try:
+                for model, rows in copy_tables(source.alias, target, chunk_size=options['chunk_size']):
+                    self.stdout.write(f"{model._meta.label}: {rows} row(s)")
+                    copied += rows
+            except RowCountMismatch as exc:
+                raise CommandError(f"Row counts differ, nothing was copied: {exc}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Copied {copied} row(s) in {len(MODELS)} tables "
+            f"in {time.perf_counter() - started:.1f}s; row counts match"
+        ))
@@ -0,0 +1,99 @@
+import re
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count, Sum
+
+from votes.board import board_queryset
+from votes.models import Assignment, Rating, Vote
+from votes.ratings import unrated_votes
+from votes.rotation import get_current_interval
+
+# What a full table scan looks like in each backend's plan output
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (?P<table>\w+)\b(?! USING)'),
+    'postgresql': re.compile(r'Seq Scan on (?P<table>\w+)'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Print the query plan of the views' hot queries and fail if any of them "
+        "scans a whole table or doesn't use the index it was written for."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        vendor = connections[alias].vendor
+        if vendor not in FULL_SCAN_PATTERNS:
+            raise CommandError(f"Don't know how to read {vendor} query plans")
+        full_scan = FULL_SCAN_PATTERNS[vendor]
+
+        user = User.objects.using(alias).order_by('id').first() or User(id=0)
+        interval = get_current_interval()
+        circle = Assignment.objects.filter(hour_interval=interval, community_id=None, is_active=True)
+
+        # Each query with the columns of the indexes it may go through (planners differ)
+        group_idx = ['hour_interval', 'community_id', 'is_active']
+        queries = {
+            'index: board': (board_queryset(interval), [group_idx]),
+            'index: community board': (board_queryset(interval, community_id=0), [group_idx]),
+            'index: unrated vote': (unrated_votes(user, interval), [['recipient_id', 'hour_interval']]),
+            'rotation: interval assignments': (
+                Assignment.objects.filter(hour_interval=interval).values_list('user_id', 'id'),
+                [['hour_interval', 'is_active'], group_idx],
+            ),
+            'rotation: group circle': (circle.values('id'), [group_idx]),
+            'rotation: random edge': (circle.filter(id__gte=0).order_by('id')[:1], [group_idx]),
+            'rotation: outgoing assignment': (
+                Assignment.objects.filter(hour_interval=interval, is_active=True, user=user),
+                [['user_id', 'hour_interval']],
+            ),
+            'rotation: incoming assignment': (
+                Assignment.objects.filter(hour_interval=interval, is_active=True, assigned_to=user),
+                [['assigned_to_id'], ['hour_interval', 'is_active']],
+            ),
+            'rotation: votes to rate': (
+                Vote.objects.filter(hour_interval=interval, awaiting_rating=True).values_list('recipient_id', flat=True),
+                # PostgreSQL may read the (smaller) pending-ratings index instead
+                [['hour_interval', 'recipient_id'], ['recipient_id', 'hour_interval']],
+            ),
+            'submit_rating: existing rating': (Rating.objects.filter(rater=user, vote_id=0), [['rater_id', 'vote_id']]),
+            'ratings: user totals': (
+                Rating.objects.filter(rated_user=user).values('rated_user_id').annotate(total=Sum('score'), n=Count('id')),
+                [['rated_user_id', 'score']],
+            ),
+        }
+
+        offenders = []
+        for name, (queryset, expected) in queries.items():
+            plan = queryset.using(alias).explain()
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan)
+            scanned = [match.group('table') for match in full_scan.finditer(plan)]
+            if scanned:
+                offenders.append(f"{name} scans {', '.join(scanned)}")
+                continue
+            indexes = index_names(alias, queryset.model, expected)
+            if not any(re.search(rf'\b{re.escape(index)}\b', plan) for index in indexes):
+                wanted = ' or '.join(indexes) or f"an index on {' / '.join(map(str, expected))}"
+                offenders.append(f"{name} doesn't use {wanted}")
+
+        if offenders:
+            raise CommandError("Unexpected query plan: " + '; '.join(offenders))
+        self.stdout.write(self.style.SUCCESS(f"{len(queries)} queries checked, each uses its index"))
+
+
+def index_names(alias, model, column_lists):
+    """Names of ``model``'s indexes whose columns are exactly one of ``column_lists``."""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return [
+        name for name, constraint in constraints.items()
+        if (constraint['index'] or constraint['unique']) and constraint['columns'] in column_lists
+    ]
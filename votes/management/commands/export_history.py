@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from votes.exports import CHUNK_SIZE, FORMATS, TABLES, stream
+
+
+def _day(value):
+    try:
+        return timezone.make_aware(datetime.strptime(value, '%Y-%m-%d'))
+    except ValueError:
+        raise CommandError(f"Dates must be in YYYY-MM-DD format, got {value!r}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream assignment, vote or rating history as CSV or JSON lines in constant memory. "
+        "Staff can fetch the same files from /votes/export/<table>/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('table', choices=sorted(TABLES))
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--from', dest='start', help="First day to include (YYYY-MM-DD).")
+        parser.add_argument('--to', dest='end', help="Last day to include (YYYY-MM-DD).")
+        parser.add_argument('--output', '-o', help="Write to this file instead of stdout.")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows fetched per round trip.")
+
+    def handle(self, *args, **options):
+        start = _day(options['start']) if options['start'] else None
+        end = _day(options['end']) + timedelta(days=1) if options['end'] else None
+        lines = stream(options['table'], options['format'], start, end, options['chunk_size'])
+
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+            rows = 0
+            for line in lines:
+                output.write(line)
+                rows += 1
+        if options['format'] == 'csv':
+            rows -= 1  # header
+        self.stdout.write(self.style.SUCCESS(f"Exported {rows} {options['table']} row(s) to {options['output']}"))
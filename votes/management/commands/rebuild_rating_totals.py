@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Sum
+
+from votes.models import ArchivedRating, Profile, Rating
+from votes.profiles import forget_profiles
+from votes.writes import write_transaction
+
+
+class Command(BaseCommand):
+    help = "Recompute Profile.rating_sum / rating_count from the Rating and ArchivedRating tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help="Only report profiles whose totals have drifted; exit with an error if any did.",
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            drifted = self.drifted_profiles()
+            for profile in drifted:
+                self.stdout.write(f"user {profile.user_id}: expected sum={profile.rating_sum} count={profile.rating_count}")
+            if drifted:
+                raise CommandError(f"{len(drifted)} profile(s) have stale rating totals")
+            self.stdout.write(self.style.SUCCESS("All rating totals are up to date"))
+            return
+
+        # Read and write in one transaction, or a rating recorded in between would
+        # have its delta overwritten. SQLite holds the write lock from the start; on
+        # PostgreSQL the profiles are locked before the ratings are read, so a rating
+        # committed meanwhile is either counted below or waits and adds its delta after
+        with write_transaction():
+            list(Profile.objects.select_for_update().order_by('pk').values_list('pk', flat=True))
+            drifted = self.drifted_profiles()
+            Profile.objects.bulk_update(drifted, ['rating_sum', 'rating_count'], batch_size=500)
+            forget_profiles(profile.user_id for profile in drifted)
+        self.stdout.write(self.style.SUCCESS(f"Fixed rating totals for {len(drifted)} profile(s)"))
+
+    def drifted_profiles(self):
+        """Profiles whose totals differ from their ratings, with the correct totals set (unsaved)."""
+        expected = {}
+        # Archived ratings (votes.archive) still count towards the totals
+        for model in (Rating, ArchivedRating):
+            for row in model.objects.order_by().values('rated_user_id').annotate(total=Sum('score'), n=Count('id')):
+                rating_sum, rating_count = expected.get(row['rated_user_id'], (0, 0))
+                expected[row['rated_user_id']] = (rating_sum + row['total'], rating_count + row['n'])
+
+        drifted = []
+        for profile in Profile.objects.only('id', 'user_id', 'rating_sum', 'rating_count').iterator(chunk_size=2000):
+            rating_sum, rating_count = expected.get(profile.user_id, (0, 0))
+            if (profile.rating_sum, profile.rating_count) != (rating_sum, rating_count):
+                profile.rating_sum = rating_sum
+                profile.rating_count = rating_count
+                drifted.append(profile)
+        return drifted
@@ -0,0 +1,77 @@
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from votes.models import Community
+from votes.rotation import get_current_interval, rotate
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the weekly assignments for the current interval (Saturday 20:00), one circle per group. "
+        "Each group commits on its own; safe to run repeatedly, and a rerun only builds the groups "
+        "still missing. Scheduled by railway.cron.json at 20:05 every Saturday."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help="Rotate the interval containing this date (YYYY-MM-DD) instead of now.",
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help="Delete and rebuild the interval even if it was already rotated.",
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=getattr(settings, 'VOTES_ROTATION_WORKERS', 1),
+            help="Processes rotating groups in parallel (default: VOTES_ROTATION_WORKERS).",
+        )
+
+    def handle(self, *args, **options):
+        now = None
+        if options['date']:
+            try:
+                day = datetime.strptime(options['date'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError("--date must be in YYYY-MM-DD format")
+            now = timezone.make_aware(day.replace(hour=23, minute=59))
+
+        interval = get_current_interval(now)
+        names = dict(Community.objects.values_list('id', 'name'))
+        verbosity = options['verbosity']
+
+        def progress(result, done, total):
+            name = names.get(result['community_id'], 'default group')
+            if result['error']:
+                self.stderr.write(f"[{done}/{total}] {name}: failed\n{result['error']}")
+            elif result['created']:
+                self.stdout.write(f"[{done}/{total}] {name}: {result['users']} users in {result['seconds']}s")
+                if verbosity > 1:
+                    self.stdout.write(f"    Builder stats: {', '.join(f'{k}={v}' for k, v in result['stats'].items())}")
+            elif verbosity > 1:
+                self.stdout.write(f"[{done}/{total}] {name}: already rotated")
+
+        started = time.perf_counter()
+        results = rotate(interval, force=options['force'], workers=options['workers'], progress=progress)
+        elapsed = time.perf_counter() - started
+
+        failed = [result for result in results if result['error']]
+        created = [result for result in results if result['created']]
+        if failed:
+            raise CommandError(
+                f"{len(failed)} of {len(results)} group(s) failed for {interval:%Y-%m-%d %H:%M}; "
+                f"the other groups were committed, rerun to retry"
+            )
+        if created:
+            self.stdout.write(self.style.SUCCESS(
+                f"Created assignments for {sum(result['users'] for result in created)} users in "
+                f"{len(created)} group(s) ({interval:%Y-%m-%d %H:%M}) in {elapsed:.2f}s"
+            ))
+        else:
+            self.stdout.write(f"Interval {interval:%Y-%m-%d %H:%M} already rotated, nothing to do")
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from votes.models import WeeklySnapshot
+from votes.rotation import get_current_interval
+from votes.snapshots import snapshot_weeks, take_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the weekly leaderboard snapshots. rotate does this for the week it closes; "
+        "use this to backfill history or re-take a week."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help="Snapshot the interval containing this date (YYYY-MM-DD) only.",
+        )
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help="Skip weeks that already have a snapshot.",
+        )
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                day = datetime.strptime(options['date'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError("--date must be in YYYY-MM-DD format")
+            weeks = [get_current_interval(timezone.make_aware(day.replace(hour=23, minute=59)))]
+        else:
+            # Every rotated week except the one still running
+            weeks = list(snapshot_weeks(get_current_interval()))
+
+        if options['missing']:
+            done = set(WeeklySnapshot.objects.filter(hour_interval__in=weeks).values_list('hour_interval', flat=True).distinct())
+            weeks = [week for week in weeks if week not in done]
+
+        for week in weeks:
+            rows = take_snapshot(week)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{week:%Y-%m-%d}: {rows} row(s)")
+        self.stdout.write(self.style.SUCCESS(f"Wrote snapshots for {len(weeks)} week(s)"))
@@ -0,0 +1,237 @@
+"""
+Per-request performance metrics.
+
+``RequestMetricsMiddleware`` counts queries and DB time for every request,
+picks up template render time from ``TimedDjangoTemplates``, sends them back
+as a ``Server-Timing`` header and folds them into an in-process histogram
+per view (``registry``). Staff can read the histogram at
+``/votes/stats/requests/``.
+
+Set ``REQUEST_PROFILE_SAMPLE_RATE`` to run a fraction of requests under
+cProfile; those slower than ``REQUEST_PROFILE_SLOW_MS`` keep their profile
+for the stats endpoint. An async request is profiled on the event loop and
+on the request's sync thread (where the ORM and template rendering run);
+the event loop's share also includes whatever other requests did meanwhile.
+"""
+
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, float('inf'))
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with connection.execute_wrapper()
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - started
+
+
+class MetricsRegistry:
+    """Thread-safe per-view aggregates and the most recent slow-request profiles."""
+
+    def __init__(self, keep_profiles=20):
+        self._lock = threading.Lock()
+        self._views = {}
+        self.profiles = deque(maxlen=keep_profiles)
+
+    def record(self, view, metrics, total_seconds):
+        total_ms = total_seconds * 1000
+        with self._lock:
+            stats = self._views.setdefault(view, {
+                'count': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'db_ms': 0.0,
+                'template_ms': 0.0,
+                'queries': 0,
+                'max_queries': 0,
+                'buckets': [0] * len(BUCKETS_MS),
+            })
+            stats['count'] += 1
+            stats['total_ms'] += total_ms
+            stats['max_ms'] = max(stats['max_ms'], total_ms)
+            stats['db_ms'] += metrics.db_seconds * 1000
+            stats['template_ms'] += metrics.template_seconds * 1000
+            stats['queries'] += metrics.queries
+            stats['max_queries'] = max(stats['max_queries'], metrics.queries)
+            stats['buckets'][next(i for i, bound in enumerate(BUCKETS_MS) if total_ms <= bound)] += 1
+
+    def add_profile(self, view, path, total_seconds, profile_text):
+        with self._lock:
+            self.profiles.append({
+                'view': view,
+                'path': path,
+                'total_ms': round(total_seconds * 1000, 1),
+                'profile': profile_text,
+            })
+
+    def snapshot(self):
+        with self._lock:
+            views = {}
+            for view, stats in self._views.items():
+                count = stats['count']
+                views[view] = {
+                    'count': count,
+                    'avg_ms': round(stats['total_ms'] / count, 2),
+                    'max_ms': round(stats['max_ms'], 2),
+                    'avg_db_ms': round(stats['db_ms'] / count, 2),
+                    'avg_template_ms': round(stats['template_ms'] / count, 2),
+                    'avg_queries': round(stats['queries'] / count, 2),
+                    'max_queries': stats['max_queries'],
+                    'histogram_ms': {
+                        ('+inf' if bound == float('inf') else str(bound)): n
+                        for bound, n in zip(BUCKETS_MS, stats['buckets'])
+                    },
+                }
+            return {'views': views, 'slow_profiles': list(self.profiles)}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+            self.profiles.clear()
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        profiler = self._start_profiler() if self._sampled() else None
+        started = time.perf_counter()
+        try:
+            with self._track_queries(metrics):
+                response = self.get_response(request)
+        finally:
+            total = time.perf_counter() - started
+            if profiler:
+                profiler.disable()
+            _current.reset(token)
+
+        self._finish(request, response, metrics, total, [profiler])
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        loop_profiler = thread_profiler = None
+        if self._sampled():
+            loop_profiler = self._start_profiler()
+            thread_profiler = await sync_to_async(self._start_profiler)()
+        started = time.perf_counter()
+        # Database connections belong to the request's sync thread, where
+        # the async ORM runs its queries; install the wrappers there
+        tracker = await sync_to_async(self._track_queries)(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(tracker.close)()
+            total = time.perf_counter() - started
+            # A profiler has to be stopped on the thread that started it
+            if thread_profiler:
+                await sync_to_async(thread_profiler.disable)()
+            if loop_profiler:
+                loop_profiler.disable()
+            _current.reset(token)
+
+        self._finish(request, response, metrics, total, [loop_profiler, thread_profiler])
+        return response
+
+    def _track_queries(self, metrics):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(metrics))
+        return stack
+
+    def _sampled(self):
+        return random.random() < getattr(settings, 'REQUEST_PROFILE_SAMPLE_RATE', 0)
+
+    def _start_profiler(self):
+        """Profile the calling thread; None if it is already being profiled."""
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already running in this process
+            return None
+        return profiler
+
+    def _finish(self, request, response, metrics, total, profilers):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={metrics.db_seconds * 1000:.1f};desc="{metrics.queries} queries"',
+            f'tpl;dur={metrics.template_seconds * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        registry.record(view, metrics, total)
+
+        profilers = [profiler for profiler in profilers if profiler]
+        if profilers and total * 1000 >= getattr(settings, 'REQUEST_PROFILE_SLOW_MS', 500):
+            output = io.StringIO()
+            pstats.Stats(*profilers, stream=output).sort_stats('cumulative').print_stats(25)
+            registry.add_profile(view, request.path, total, output.getvalue())
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics = _current.get()
+            if metrics is not None:
+                metrics.template_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The stock Django template backend, reporting render time to the request metrics."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
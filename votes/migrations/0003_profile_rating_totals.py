@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-18 04:59
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_rating_totals(apps, schema_editor):
+    Profile = apps.get_model('votes', 'Profile')
+    Rating = apps.get_model('votes', 'Rating')
+    totals = Rating.objects.order_by().values('rated_user_id').annotate(total=Sum('score'), n=Count('id'))
+    for row in totals:
+        Profile.objects.filter(user_id=row['rated_user_id']).update(rating_sum=row['total'], rating_count=row['n'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votes', '0002_rotation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_rating_totals, migrations.RunPython.noop),
+    ]
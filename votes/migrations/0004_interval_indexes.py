@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-18 05:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votes', '0003_profile_rating_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['hour_interval', 'is_active'], name='assignment_interval_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['rated_user', 'score'], name='rating_rated_user_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['recipient', '-hour_interval'], name='vote_recipient_interval_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(fields=['hour_interval', 'recipient'], name='vote_interval_recipient_idx'),
+        ),
+    ]
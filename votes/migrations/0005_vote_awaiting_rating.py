@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-18 05:10
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def clear_rated_votes(apps, schema_editor):
+    Vote = apps.get_model('votes', 'Vote')
+    Rating = apps.get_model('votes', 'Rating')
+    rated = Rating.objects.filter(rater_id=F('vote__recipient_id')).values('vote_id')
+    Vote.objects.filter(id__in=rated).update(awaiting_rating=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votes', '0004_interval_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='vote',
+            name='vote_recipient_interval_idx',
+        ),
+        migrations.AddField(
+            model_name='vote',
+            name='awaiting_rating',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.RunPython(clear_rated_votes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='vote',
+            index=models.Index(condition=models.Q(('awaiting_rating', True)), fields=['recipient', '-hour_interval'], name='vote_awaiting_rating_idx'),
+        ),
+    ]
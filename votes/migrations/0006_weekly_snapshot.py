@@ -0,0 +1,48 @@
+# Generated by Django 5.1.2 on 2026-10-18 05:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votes', '0005_vote_awaiting_rating'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour_interval', models.DateTimeField()),
+                ('votes_received', models.PositiveIntegerField(default=0)),
+                ('rating_sum', models.PositiveIntegerField(default=0)),
+                ('rating_count', models.PositiveIntegerField(default=0)),
+                ('rank', models.PositiveIntegerField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['rated_at', 'rated_user', 'score'], name='rating_rated_at_idx'),
+        ),
+        migrations.AddField(
+            model_name='weeklysnapshot',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_snapshots', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='weeklysnapshot',
+            index=models.Index(fields=['hour_interval', 'rank'], name='snapshot_leaderboard_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weeklysnapshot',
+            index=models.Index(fields=['user', '-hour_interval'], name='snapshot_user_history_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='weeklysnapshot',
+            unique_together={('hour_interval', 'user')},
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.2 on 2026-10-18 05:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votes', '0006_weekly_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedVote',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour_interval', models.DateTimeField(db_index=True)),
+                ('voter_id', models.IntegerField()),
+                ('recipient_id', models.IntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedRating',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour_interval', models.DateTimeField()),
+                ('rater_id', models.IntegerField(db_index=True)),
+                ('rated_user_id', models.IntegerField()),
+                ('score', models.PositiveSmallIntegerField()),
+                ('rated_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['rated_at', 'rated_user_id', 'score'], name='archived_rating_rated_at_idx')],
+            },
+        ),
+    ]
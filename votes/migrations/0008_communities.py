@@ -0,0 +1,59 @@
+# Generated by Django 5.1.2 on 2026-10-18 05:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('votes', '0007_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Community',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'communities',
+            },
+        ),
+        migrations.AlterField(
+            model_name='rotation',
+            name='hour_interval',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddField(
+            model_name='assignment',
+            name='community',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='assignments', to='votes.community'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='community',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='members', to='votes.community'),
+        ),
+        migrations.AddField(
+            model_name='rotation',
+            name='community',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rotations', to='votes.community'),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['hour_interval', 'community', 'is_active'], name='assignment_group_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='rotation',
+            constraint=models.UniqueConstraint(condition=models.Q(('community__isnull', True)), fields=('hour_interval',), name='rotation_default_group_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='rotation',
+            constraint=models.UniqueConstraint(fields=('hour_interval', 'community'), name='rotation_group_unique'),
+        ),
+    ]
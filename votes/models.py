@@ -1,18 +1,42 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
+class Community(models.Model):
+    """A group of users with its own weekly circle and board (see votes.rotation)."""
+    name = models.CharField(max_length=100, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'communities'
+
+    def __str__(self):
+        return self.name
+
 class Assignment(models.Model):
     """Weekly random vote target for a user."""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='assignments')
     assigned_to = models.ForeignKey(User, on_delete=models.CASCADE, related_name='assigned_from')
     hour_interval = models.DateTimeField(default=timezone.now)  # Keep same field name
     is_active = models.BooleanField(default=True)
+    # The circle this pairing belongs to; empty for the default group. No index of its
+    # own: assignment_group_idx covers it, and SQLite would pick a bare one for
+    # community IS NULL and read the default group's whole history
+    community = models.ForeignKey(
+        Community, on_delete=models.SET_NULL, null=True, blank=True, related_name='assignments',
+        db_index=False,
+    )
 
     class Meta:
         unique_together = ('user', 'hour_interval')
+        indexes = [
+            # The board and the rotation engine look up whole intervals
+            models.Index(fields=['hour_interval', 'is_active'], name='assignment_interval_idx'),
+            # ...one group's circle at a time
+            models.Index(fields=['hour_interval', 'community', 'is_active'], name='assignment_group_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} -> {self.assigned_to.username} ({self.hour_interval:%Y-%m-%W})"
@@ -24,9 +48,20 @@ class Vote(models.Model):
     assignment = models.OneToOneField(Assignment, on_delete=models.CASCADE, related_name='vote')
     hour_interval = models.DateTimeField(default=timezone.now)  # Keep same field name
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Pending-ratings queue: set until the recipient rates this vote
+    awaiting_rating = models.BooleanField(default=True)
 
     class Meta:
         unique_together = ('voter', 'hour_interval')
+        indexes = [
+            # Next vote for a user to rate, newest first; only pending rows are indexed
+            models.Index(
+                fields=['recipient', '-hour_interval'],
+                condition=models.Q(awaiting_rating=True),
+                name='vote_awaiting_rating_idx',
+            ),
+            models.Index(fields=['hour_interval', 'recipient'], name='vote_interval_recipient_idx'),
+        ]
 
     def __str__(self):
         return f"{self.voter.username} votes for {self.recipient.username} ({self.hour_interval:%Y-%m-%W})"
@@ -41,36 +76,171 @@ class Rating(models.Model):
 
     class Meta:
         unique_together = ('rater', 'vote')
+        indexes = [
+            # Covers per-user rating totals without touching the table
+            models.Index(fields=['rated_user', 'score'], name='rating_rated_user_score_idx'),
+            # Covers a week's ratings for the weekly snapshot
+            models.Index(fields=['rated_at', 'rated_user', 'score'], name='rating_rated_at_idx'),
+        ]
 
     def __str__(self):
         return f"{self.rater.username} rated {self.rated_user.username} {self.score}⭐"
 
+class Rotation(models.Model):
+    """Marker for a weekly interval whose assignments have been built, one per group."""
+    hour_interval = models.DateTimeField()
+    community = models.ForeignKey(
+        Community, on_delete=models.CASCADE, null=True, blank=True, related_name='rotations'
+    )
+    user_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # NULLs never collide in a unique index, so the default group gets its own
+            models.UniqueConstraint(
+                fields=['hour_interval'],
+                condition=models.Q(community__isnull=True),
+                name='rotation_default_group_unique',
+            ),
+            models.UniqueConstraint(fields=['hour_interval', 'community'], name='rotation_group_unique'),
+        ]
+
+    def __str__(self):
+        return f"Rotation {self.hour_interval:%Y-%m-%d %H:%M} {self.community or 'default'} ({self.user_count} users)"
+
+class WeeklySnapshot(models.Model):
+    """Per-user totals for one closed interval, written by votes.snapshots."""
+    hour_interval = models.DateTimeField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='weekly_snapshots')
+    votes_received = models.PositiveIntegerField(default=0)
+    # Ratings received during the week
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    # Position by average rating among users rated that week; empty if unrated
+    rank = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('hour_interval', 'user')
+        indexes = [
+            models.Index(fields=['hour_interval', 'rank'], name='snapshot_leaderboard_idx'),
+            models.Index(fields=['user', '-hour_interval'], name='snapshot_user_history_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} week of {self.hour_interval:%Y-%m-%d}: {self.average_rating}⭐ (#{self.rank})"
+
+    @property
+    def average_rating(self):
+        if self.rating_count:
+            return round(self.rating_sum / self.rating_count, 1)
+        return 0
+
+class ArchivedVote(models.Model):
+    """Compact copy of an archived assignment and its vote (see votes.archive)."""
+    # Plain ids: archived history doesn't hold foreign keys into the hot tables
+    hour_interval = models.DateTimeField(db_index=True)
+    voter_id = models.IntegerField()
+    recipient_id = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.voter_id} votes for {self.recipient_id} ({self.hour_interval:%Y-%m-%W})"
+
+class ArchivedRating(models.Model):
+    """Compact copy of an archived rating; still counted in Profile totals."""
+    hour_interval = models.DateTimeField()
+    rater_id = models.IntegerField(db_index=True)
+    rated_user_id = models.IntegerField()
+    score = models.PositiveSmallIntegerField()
+    rated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Same shape as rating_rated_at_idx, for weekly snapshots
+            models.Index(fields=['rated_at', 'rated_user_id', 'score'], name='archived_rating_rated_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.rater_id} rated {self.rated_user_id} {self.score}⭐ ({self.hour_interval:%Y-%m-%W})"
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     is_bestie = models.BooleanField(default=True)
     bio = models.CharField(max_length=200, blank=True)
     date_joined = models.DateTimeField(auto_now_add=True)
+    # Empty for the default group; a move takes effect at the next rotation
+    community = models.ForeignKey(
+        Community, on_delete=models.SET_NULL, null=True, blank=True, related_name='members'
+    )
+    # Running totals kept up to date by votes.ratings
+    rating_sum = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
     @property
     def average_rating(self):
-        ratings = Rating.objects.filter(rated_user=self.user)
-        if ratings.exists():
-            return round(ratings.aggregate(models.Avg('score'))['score__avg'], 1)
+        if self.rating_count:
+            return round(self.rating_sum / self.rating_count, 1)
         return 0
 
     @property
     def total_ratings(self):
-        return Rating.objects.filter(rated_user=self.user).count()
+        return self.rating_count
+
+@receiver([post_save, post_delete], sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    from .auth import forget_user
+    forget_user(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def forget_cached_profile(sender, instance, **kwargs):
+    from .profiles import forget_profiles
+    forget_profiles([instance.user_id])
+
 
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
 
+
 @receiver(post_save, sender=User)
-def save_profile(sender, instance, **kwargs):
-    instance.profile.save()
-    
\ No newline at end of file
+def update_rotation_membership(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only touch last_login, nothing to do for those
+    if update_fields is not None and 'is_active' not in update_fields:
+        return
+    from .rotation import splice_in, splice_out
+    if instance.is_active:
+        splice_in(instance)
+    elif not created:
+        splice_out(instance)
+
+def _users_being_deleted(instance, origin):
+    """Ids of every user removed by the same ``delete()`` call as ``instance``."""
+    if not isinstance(origin, models.QuerySet) or origin.model is not User:
+        return {instance.pk}
+    # Worked out once per batch; pre_delete runs before any row is gone
+    if not hasattr(origin, '_deleting_user_ids'):
+        origin._deleting_user_ids = set(origin.values_list('pk', flat=True))
+    return origin._deleting_user_ids
+
+@receiver(pre_delete, sender=User)
+def leave_rotation(sender, instance, origin=None, **kwargs):
+    from .ratings import discard_ratings
+    from .rotation import find_gap
+    instance._rotation_gap = find_gap(instance, leaving=_users_being_deleted(instance, origin))
+    # Ratings this user gave disappear with them, archived ones included
+    discard_ratings(Rating.objects.filter(rater=instance))
+    archived = ArchivedRating.objects.filter(rater_id=instance.pk)
+    discard_ratings(archived)
+    archived.delete()
+
+@receiver(post_delete, sender=User)
+def close_rotation_gap(sender, instance, **kwargs):
+    gap = getattr(instance, '_rotation_gap', None)
+    if gap:
+        from .rotation import close_gap
+        close_gap(*gap)
@@ -0,0 +1,64 @@
+"""
+Profile lifecycle.
+
+A profile is created once: by the ``create_profile`` signal for new users,
+or in bulk by ``ensure_profiles`` (rotations, ``manage.py backfill_profiles``)
+for users that predate it. Nothing re-saves it as a side effect of saving
+the user.
+
+Reads go through the account cache (see ``votes/auth.py``);
+``forget_profiles()`` drops cached copies after writes that send no signals.
+"""
+
+from django.contrib.auth.models import User
+
+from .auth import account_cache, account_cache_timeout, forget
+from .models import Profile
+
+BATCH_SIZE = 500
+
+
+def ensure_profiles(user_ids):
+    """Bulk-create profiles for any of ``user_ids`` that lack one. Returns how many were created."""
+    user_ids = list(user_ids)
+    existing = set(Profile.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+    missing = [Profile(user_id=user_id) for user_id in user_ids if user_id not in existing]
+    Profile.objects.bulk_create(missing, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    return len(missing)
+
+
+def profile_key(user_id):
+    return f'votes:profile:{user_id}'
+
+
+def forget_profiles(user_ids):
+    forget(profile_key(user_id) for user_id in user_ids)
+
+
+def get_profile(user):
+    """``user.profile`` from the cache, created on the spot for a user who somehow has none."""
+    if User.profile.is_cached(user):
+        return user.profile
+    cache = account_cache()
+    profile = cache.get(profile_key(user.pk))
+    if profile is None:
+        try:
+            profile = Profile.objects.get(user=user)
+        except Profile.DoesNotExist:
+            profile, _ = Profile.objects.get_or_create(user=user)
+        cache.set(profile_key(user.pk), profile, account_cache_timeout())
+    user.profile = profile
+    return profile
+
+
+async def aget_profile(user):
+    """``get_profile`` for async views."""
+    if User.profile.is_cached(user):
+        return user.profile
+    cache = account_cache()
+    profile = await cache.aget(profile_key(user.pk))
+    if profile is None:
+        profile, _ = await Profile.objects.aget_or_create(user=user)
+        await cache.aset(profile_key(user.pk), profile, account_cache_timeout())
+    user.profile = profile
+    return profile
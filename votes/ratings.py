@@ -0,0 +1,119 @@
+"""
+Rating writes.
+
+``Profile.rating_sum`` and ``Profile.rating_count`` hold each user's running
+totals so the leaderboard never aggregates the ``Rating`` table. Every path
+that creates, changes or deletes ratings goes through here to keep them in
+step; ``manage.py rebuild_rating_totals`` recomputes them from scratch.
+"""
+
+from django.db.models import Case, Count, F, Sum, Value, When
+
+from . import board
+from .models import Profile, Rating, Vote
+from .profiles import forget_profiles
+from .writes import write_transaction
+
+
+def record_rating(rater, vote, score):
+    """Create or update ``rater``'s rating of ``vote``; see ``record_ratings``."""
+    return record_ratings(rater, {vote.id: score})[vote.id]
+
+
+def record_ratings(rater, scores):
+    """
+    Upsert ``rater``'s ratings from a ``{vote_id: score}`` mapping in one transaction.
+
+    Only votes ``rater`` received can be rated. Returns ``{vote_id: status}``
+    with status ``created``, ``updated``, ``unchanged`` or ``not_found``.
+    """
+    with write_transaction():
+        # Ownership check for the whole batch in one query. It also locks the votes (in id
+        # order, against deadlocks), so on PostgreSQL a concurrent submit of the same vote
+        # waits here and then reads this one's rating; SQLite already writes one at a time
+        voters = dict(
+            Vote.objects.select_for_update().filter(id__in=list(scores), recipient=rater)
+            .order_by('id').values_list('id', 'voter_id')
+        )
+        previous = dict(
+            Rating.objects.filter(rater=rater, vote_id__in=list(voters)).values_list('vote_id', 'score')
+        )
+
+        results = {vote_id: 'not_found' for vote_id in scores}
+        changed = []
+        deltas = {}
+        for vote_id, voter_id in voters.items():
+            score = scores[vote_id]
+            old_score = previous.get(vote_id)
+            if old_score == score:
+                results[vote_id] = 'unchanged'
+                continue
+            results[vote_id] = 'created' if old_score is None else 'updated'
+            changed.append(Rating(rater=rater, rated_user_id=voter_id, vote_id=vote_id, score=score))
+            score_delta, count_delta = deltas.get(voter_id, (0, 0))
+            deltas[voter_id] = (
+                score_delta + score - (old_score or 0),
+                count_delta + (old_score is None),
+            )
+
+        if changed:
+            Rating.objects.bulk_create(
+                changed,
+                update_conflicts=True,
+                unique_fields=['rater', 'vote'],
+                update_fields=['score'],
+            )
+            _adjust_totals_many(deltas)
+            Vote.objects.filter(id__in=list(voters), awaiting_rating=True).update(awaiting_rating=False)
+            board.bump_version()
+
+    return results
+
+
+def unrated_votes(user, interval):
+    """
+    Votes ``user`` received before ``interval`` and hasn't rated yet, newest first.
+
+    Reads the ``awaiting_rating`` queue, so the cost doesn't grow with history.
+    """
+    return Vote.objects.filter(
+        recipient=user,
+        awaiting_rating=True,
+        hour_interval__lt=interval
+    ).select_related('voter').order_by('-hour_interval')
+
+
+def discard_ratings(ratings):
+    """Take the given ratings out of the totals before they are deleted."""
+    per_user = ratings.order_by().values('rated_user_id').annotate(total=Sum('score'), n=Count('id'))
+    changed = False
+    for row in per_user:
+        _adjust_totals(row['rated_user_id'], -row['total'], -row['n'])
+        changed = True
+    if changed:
+        board.bump_version()
+
+
+def _adjust_totals(user_id, score_delta, count_delta):
+    Profile.objects.filter(user_id=user_id).update(
+        rating_sum=F('rating_sum') + score_delta,
+        rating_count=F('rating_count') + count_delta,
+    )
+    forget_profiles([user_id])
+
+
+def _adjust_totals_many(deltas):
+    """Apply ``{user_id: (score_delta, count_delta)}`` in a single UPDATE."""
+    if not deltas:
+        return
+    Profile.objects.filter(user_id__in=list(deltas)).update(
+        rating_sum=F('rating_sum') + Case(
+            *[When(user_id=user_id, then=Value(score)) for user_id, (score, _) in deltas.items()],
+            default=Value(0),
+        ),
+        rating_count=F('rating_count') + Case(
+            *[When(user_id=user_id, then=Value(count)) for user_id, (_, count) in deltas.items()],
+            default=Value(0),
+        ),
+    )
+    forget_profiles(deltas)
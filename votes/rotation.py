@@ -0,0 +1,315 @@
+"""
+Weekly rotation engine.
+
+Assignments rotate every Saturday at 20:00. Each group (``Community``, plus
+the default group of users who belong to none) gets its own circle, built
+by ``rotate_group()`` exactly once per interval. The group's ``Rotation`` row
+is claimed first (the unique constraint doubles as a DB-level lock, so
+concurrent workers queue behind it), then every assignment and vote is
+written by ``votes.builder`` with bulk inserts inside the same transaction.
+
+``rotate()`` rotates every group, each in its own transaction, so one
+failing group doesn't roll back the others. It can spread the groups over
+a process pool (see ``votes.runner``). It then closes the previous week
+once: it writes the leaderboard snapshot (see ``votes.snapshots``) and
+tells open pages.
+
+Run it on a schedule with ``python manage.py rotate``: ``railway.cron.json``
+is the config of a Railway cron service that runs it every Saturday at
+20:05 UTC (``TIME_ZONE``). If a run is missed, ``ensure_rotated()`` builds
+a group's circle on its first page view of the week instead. Users who join or leave mid-week are spliced in and out of
+their group's existing circle; a user moved to another group joins its
+circle at the next rotation.
+"""
+
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Min
+from django.utils import timezone
+
+from . import board, events, snapshots
+from .builder import AssignmentBuilder
+from .models import Assignment, Community, Profile, Rating, Rotation, Vote
+from .profiles import ensure_profiles
+from .ratings import discard_ratings
+from .writes import write_transaction
+
+ROTATION_WEEKDAY = 5  # Saturday
+ROTATION_HOUR = 20
+
+
+def get_current_interval(now=None):
+    """Start of the weekly period containing ``now`` (last Saturday 20:00)."""
+    now = now or timezone.now()
+    delta_days = (now.weekday() - ROTATION_WEEKDAY) % 7
+    last_saturday = now - timedelta(days=delta_days)
+    interval = last_saturday.replace(hour=ROTATION_HOUR, minute=0, second=0, microsecond=0)
+    if now < interval:
+        interval -= timedelta(days=7)
+    return interval
+
+
+def get_next_interval(interval):
+    return interval + timedelta(days=7)
+
+
+def get_builder():
+    """Assignment builder configured from ``settings.VOTES_ROTATION``."""
+    return AssignmentBuilder(**getattr(settings, 'VOTES_ROTATION', {}))
+
+
+def group_ids():
+    """Every group to rotate: ``None`` (the default group) first, then each community by id."""
+    return [None, *Community.objects.order_by('id').values_list('id', flat=True)]
+
+
+def group_of(user):
+    """Id of ``user``'s community, or None for the default group."""
+    return Profile.objects.filter(user=user).values_list('community_id', flat=True).first()
+
+
+def group_members(community_id):
+    """Active users of a group; users without a profile yet belong to the default group."""
+    users = User.objects.filter(is_active=True).order_by()
+    if community_id is None:
+        users = users.exclude(profile__community__isnull=False)
+    else:
+        users = users.filter(profile__community_id=community_id)
+    return users.values_list('id', flat=True)
+
+
+def rotate_group(interval, community_id=None, force=False, builder=None):
+    """
+    Build one group's assignments and votes for ``interval`` in one transaction.
+
+    Returns ``(rotation, created)``. When the group has already been rotated
+    nothing is written and ``created`` is False, unless ``force`` is set, in
+    which case its circle is wiped and rebuilt. Members who moved in from
+    another group are spliced out of their old circle first. Pass ``builder``
+    to control the pairing strategy or read its timing stats afterwards.
+    """
+    builder = builder or get_builder()
+    rotations = Rotation.objects.filter(hour_interval=interval, community_id=community_id)
+
+    with write_transaction():
+        # The first statement is a write so the lock is taken up front.
+        if force and rotations.update(user_count=0):
+            rotation = rotations.get()
+            discard_ratings(Rating.objects.filter(
+                vote__hour_interval=interval, vote__assignment__community_id=community_id
+            ))
+            Assignment.objects.filter(hour_interval=interval, community_id=community_id).delete()
+        else:
+            try:
+                with transaction.atomic():
+                    rotation = Rotation.objects.create(hour_interval=interval, community_id=community_id)
+            except IntegrityError:
+                # Another worker already rotated this group
+                return rotations.get(), False
+
+        # Members who moved here mid-week still sit in their old group's circle
+        moved = (
+            Assignment.objects.filter(hour_interval=interval, user_id__in=group_members(community_id))
+            .exclude(community_id=community_id).values_list('user_id', flat=True)
+        )
+        for user_id in list(moved):
+            splice_out(user_id, interval)
+
+        user_ids = list(group_members(community_id))
+        ensure_profiles(user_ids)
+        builder.run(interval, user_ids, community_id)
+
+        rotation.user_count = len(user_ids)
+        rotation.save(update_fields=['user_count'])
+        board.bump_version()
+
+    return rotation, True
+
+
+def rotate(interval=None, force=False, workers=1, progress=None):
+    """
+    Rotate every group for ``interval`` (defaults to the current one).
+
+    Groups run in-process one after another, or over ``workers`` processes.
+    ``progress`` is called with each group's result as it finishes. Returns
+    the results, one dict per group (see ``votes.runner.rotate_shard``).
+    Groups that fail are reported in their result, not raised.
+    """
+    from .runner import run_shards
+
+    interval = interval or get_current_interval()
+    results = run_shards(interval, group_ids(), force=force, workers=workers, progress=progress)
+    if any(result['created'] for result in results):
+        close_week(interval)
+    return results
+
+
+def ensure_rotated(interval, community_id=None):
+    """
+    Rotate one group for ``interval`` if the schedule hasn't yet; returns True if it did.
+
+    The fallback for a missed ``manage.py rotate``: the first page view of the
+    week builds its group's circle, and the first group of the week also
+    closes the previous one. When the group is rotated already this is one
+    lookup on the small ``Rotation`` table.
+    """
+    if Rotation.objects.filter(hour_interval=interval, community_id=community_id).exists():
+        return False
+    _, created = rotate_group(interval, community_id)
+    if created and Rotation.objects.filter(hour_interval=interval).count() == 1:
+        close_week(interval)
+    return created
+
+
+def close_week(interval):
+    """After ``interval`` is rotated: snapshot the week before it and tell open pages."""
+    with write_transaction():
+        snapshots.take_snapshot(interval - timedelta(days=7))
+        events.rotation_started(interval, get_next_interval(interval))
+        # Last week's votes just became rateable
+        events.votes_to_rate(set(
+            Vote.objects.filter(hour_interval=interval - timedelta(days=7), awaiting_rating=True)
+            .values_list('recipient_id', flat=True)
+        ))
+
+
+def splice_in(user, interval=None):
+    """
+    Add ``user`` to their group's existing circle: A -> B becomes A -> user -> B.
+
+    Touches one assignment/vote pair and inserts one more, instead of
+    rebuilding the week. Returns False if the group hasn't been rotated
+    yet (the next rotation picks the user up) or the user is already in it.
+    """
+    interval = interval or get_current_interval()
+    community_id = group_of(user)
+    current = Assignment.objects.filter(hour_interval=interval, community_id=community_id, is_active=True)
+
+    with write_transaction():
+        if Assignment.objects.filter(hour_interval=interval, user=user).exists():
+            return False
+        rotations = Rotation.objects.filter(hour_interval=interval, community_id=community_id)
+        if not rotations.update(user_count=F('user_count') + 1):
+            return False
+
+        edge = _random_edge(current)
+        if edge is None:
+            receiver_id = user.id
+        else:
+            receiver_id = edge.assigned_to_id
+            _redirect(edge, user.id)
+
+        assignment = Assignment.objects.create(
+            user=user, assigned_to_id=receiver_id, hour_interval=interval, is_active=True,
+            community_id=community_id,
+        )
+        Vote.objects.create(
+            voter=user, recipient_id=receiver_id, assignment=assignment, hour_interval=interval
+        )
+        board.bump_version()
+        events.assignments_changed(interval, community_id)
+    return True
+
+
+def splice_out(user, interval=None):
+    """
+    Take a deactivated ``user`` out of their circle: A -> user -> B becomes A -> B.
+
+    Returns False if the user had no assignment in the interval.
+    """
+    interval = interval or get_current_interval()
+
+    with write_transaction():
+        outgoing = Assignment.objects.filter(hour_interval=interval, user=user, is_active=True).first()
+        if outgoing is None:
+            return False
+        current = Assignment.objects.filter(
+            hour_interval=interval, community_id=outgoing.community_id, is_active=True
+        )
+
+        incoming = current.filter(assigned_to=user).exclude(pk=outgoing.pk).first()
+        if incoming is not None:
+            # The last two members of a circle end up paired with themselves
+            _redirect(incoming, outgoing.assigned_to_id)
+
+        discard_ratings(Rating.objects.filter(vote__assignment=outgoing))
+        outgoing.delete()
+        Rotation.objects.filter(
+            hour_interval=interval, community_id=outgoing.community_id, user_count__gt=0
+        ).update(user_count=F('user_count') - 1)
+        board.bump_version()
+        events.assignments_changed(interval, outgoing.community_id)
+    return True
+
+
+def find_gap(user, interval=None, leaving=()):
+    """
+    The ``(giver_id, receiver_id, community_id)`` left behind if ``user`` disappears.
+
+    Deleting a user cascades to both of their assignments before any signal
+    can rewire them, so the deletion path records the gap up front and closes
+    it with ``close_gap`` afterwards. A user paired with themselves leaves
+    ``(None, None, community_id)``; a user outside the rotation leaves ``None``.
+
+    ``leaving`` holds the ids of every user deleted in the same batch. A run
+    of them (A -> U1 -> U2 -> B) leaves one gap, A -> B: it is recorded by
+    the first user of the run, the others only leave ``(None, None, community_id)``.
+    """
+    interval = interval or get_current_interval()
+    current = Assignment.objects.filter(hour_interval=interval, is_active=True)
+    outgoing = current.filter(user=user).values_list('assigned_to_id', 'community_id').first()
+    incoming = current.filter(assigned_to=user).exclude(user=user).values_list('user_id', flat=True).first()
+    if outgoing is None:
+        return None
+    receiver_id, community_id = outgoing
+    if incoming is None or incoming in leaving:
+        return None, None, community_id
+    # Follow the circle past everybody else on their way out
+    seen = {user.pk}
+    while receiver_id in leaving and receiver_id not in seen:
+        seen.add(receiver_id)
+        receiver_id = current.filter(user_id=receiver_id).values_list('assigned_to_id', flat=True).first()
+    return incoming, receiver_id, community_id
+
+
+def close_gap(giver_id, receiver_id, community_id=None, interval=None):
+    """Pair ``giver_id`` with ``receiver_id`` after the user between them was deleted."""
+    interval = interval or get_current_interval()
+    with write_transaction():
+        Rotation.objects.filter(
+            hour_interval=interval, community_id=community_id, user_count__gt=0
+        ).update(user_count=F('user_count') - 1)
+        board.bump_version()
+        events.assignments_changed(interval, community_id)
+        if giver_id is None:
+            return
+        assignment = Assignment.objects.create(
+            user_id=giver_id, assigned_to_id=receiver_id, hour_interval=interval, is_active=True,
+            community_id=community_id,
+        )
+        Vote.objects.create(
+            voter_id=giver_id, recipient_id=receiver_id, assignment=assignment, hour_interval=interval
+        )
+
+
+def _random_edge(assignments):
+    """Pick an assignment by a random id probe rather than ORDER BY RANDOM()."""
+    bounds = assignments.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return None
+    pivot = random.randint(bounds['low'], bounds['high'])
+    return assignments.filter(id__gte=pivot).order_by('id').first()
+
+
+def _redirect(assignment, receiver_id):
+    """Point an assignment and its vote at a new receiver."""
+    # Ratings left on the vote were about the old pairing
+    stale = Rating.objects.filter(vote__assignment=assignment)
+    discard_ratings(stale)
+    stale.delete()
+    Assignment.objects.filter(pk=assignment.pk).update(assigned_to_id=receiver_id)
+    Vote.objects.filter(assignment=assignment).update(recipient_id=receiver_id, awaiting_rating=True)
@@ -0,0 +1,93 @@
+"""
+Rotation runner: one shard per group, optionally over a process pool.
+
+Each shard is a ``rotation.rotate_group()`` call with its own builder and
+its own transaction. A shard that fails is rolled back alone and comes back
+as a result with an ``error``; the shards that succeeded stay committed, and
+rerunning ``manage.py rotate`` only builds the ones still missing.
+
+With ``workers > 1`` the shards go to a ``ProcessPoolExecutor`` whose
+workers are *spawned*, not forked, so they never share the parent's open
+database connections or connection pool. A spawned worker imports this
+module before Django is set up, so the app is only imported inside the
+functions. Shards do their pairing in parallel. On SQLite their writes
+still take turns on the database lock; on PostgreSQL they don't. Tests,
+and anything else on an in-memory database, must use ``workers=1``.
+"""
+
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def rotate_shard(interval, community_id, force=False):
+    """
+    Rotate one group; never raises.
+
+    Returns ``{'community_id', 'created', 'users', 'seconds', 'stats', 'error'}``:
+    ``seconds`` is the shard's wall time, ``stats`` the builder's
+    ``BuildStats.as_dict()`` (empty if nothing was built).
+    """
+    from django.db import connections
+
+    from .rotation import get_builder, rotate_group
+
+    started = time.perf_counter()
+    builder = get_builder()
+    result = {'community_id': community_id, 'created': False, 'users': 0, 'stats': {}, 'error': None}
+    try:
+        rotation, created = rotate_group(interval, community_id, force=force, builder=builder)
+        result.update(created=created, users=rotation.user_count, stats=builder.stats.as_dict() if created else {})
+    except Exception:
+        result['error'] = traceback.format_exc()
+    finally:
+        if multiprocessing.parent_process() is not None:
+            # Pool workers outlive the task; don't leave connections open between shards
+            connections.close_all()
+    result['seconds'] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def run_shards(interval, community_ids, force=False, workers=1, progress=None):
+    """Rotate every group in ``community_ids``; results come back in the order they finish."""
+    results = []
+
+    def finished(result):
+        results.append(result)
+        if progress:
+            progress(result, len(results), len(community_ids))
+
+    if workers <= 1 or len(community_ids) <= 1:
+        for community_id in community_ids:
+            finished(rotate_shard(interval, community_id, force))
+        return results
+
+    from django.db import connections
+
+    # Let go of the parent's connections while the workers hold theirs
+    connections.close_all()
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_setup_worker) as pool:
+        futures = {
+            pool.submit(rotate_shard, interval, community_id, force): community_id
+            for community_id in community_ids
+        }
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception:
+                # The worker process itself died (e.g. killed for memory)
+                result = {
+                    'community_id': futures[future], 'created': False, 'users': 0, 'stats': {},
+                    'error': traceback.format_exc(), 'seconds': None,
+                }
+            finished(result)
+    return results
+
+
+def _setup_worker():
+    import django
+
+    # DJANGO_SETTINGS_MODULE comes from the parent's environment
+    django.setup()
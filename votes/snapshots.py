@@ -0,0 +1,118 @@
+"""
+Weekly snapshots for the leaderboard and rating history.
+
+When an interval closes (the next ``rotate()``), ``take_snapshot()`` writes
+one ``WeeklySnapshot`` row per user who received a vote or a rating that
+week: votes received in the interval, ratings received during it, and the
+user's rank by average rating. The leaderboard, history and export only
+read snapshots, so they cost O(weeks x users) however large ``Vote`` and
+``Rating`` grow. Ratings given for an earlier week land in the week they
+were given, which keeps a snapshot final once its week is over.
+
+Backfill or re-take past weeks with ``python manage.py snapshot_weeks``.
+"""
+
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Sum
+
+from .models import ArchivedRating, ArchivedVote, Rating, Rotation, Vote, WeeklySnapshot
+from .writes import write_transaction
+
+WEEK = timedelta(days=7)
+BATCH_SIZE = 1000
+
+EXPORT_FIELDS = ('week', 'user_id', 'username', 'votes_received', 'ratings_count', 'average_rating', 'rank')
+
+
+def take_snapshot(interval):
+    """(Re)write the snapshot rows for ``interval``. Returns how many were written."""
+    totals = {}
+
+    def snapshot_for(user_id):
+        return totals.setdefault(user_id, WeeklySnapshot(hour_interval=interval, user_id=user_id))
+
+    # Archived weeks (votes.archive) still count
+    for model in (Vote, ArchivedVote):
+        votes = (
+            model.objects.filter(hour_interval=interval).order_by()
+            .values_list('recipient_id').annotate(n=Count('id'))
+        )
+        for user_id, votes_received in votes:
+            snapshot_for(user_id).votes_received += votes_received
+
+    for model in (Rating, ArchivedRating):
+        ratings = (
+            model.objects.filter(rated_at__gte=interval, rated_at__lt=interval + WEEK).order_by()
+            .values_list('rated_user_id').annotate(total=Sum('score'), n=Count('id'))
+        )
+        for user_id, rating_sum, rating_count in ratings:
+            snapshot = snapshot_for(user_id)
+            snapshot.rating_sum += rating_sum
+            snapshot.rating_count += rating_count
+
+    # Archived rows can outlive their users
+    existing = set(User.objects.values_list('id', flat=True))
+    totals = {user_id: snapshot for user_id, snapshot in totals.items() if user_id in existing}
+
+    _rank([snapshot for snapshot in totals.values() if snapshot.rating_count])
+
+    with write_transaction():
+        WeeklySnapshot.objects.filter(hour_interval=interval).delete()
+        WeeklySnapshot.objects.bulk_create(totals.values(), batch_size=BATCH_SIZE)
+    return len(totals)
+
+
+def _rank(snapshots):
+    """Competition ranking (1, 2, 2, 4) by average rating, then number of ratings."""
+    def key(snapshot):
+        return snapshot.rating_sum / snapshot.rating_count, snapshot.rating_count
+
+    snapshots.sort(key=key, reverse=True)
+    previous = None
+    for position, snapshot in enumerate(snapshots, start=1):
+        if key(snapshot) != previous:
+            rank, previous = position, key(snapshot)
+        snapshot.rank = rank
+
+
+def snapshot_weeks(before):
+    """Rotated intervals that closed before ``before``, newest first."""
+    # One Rotation row per group and week
+    return (
+        Rotation.objects.filter(hour_interval__lt=before).order_by('-hour_interval')
+        .values_list('hour_interval', flat=True).distinct()
+    )
+
+
+def latest_snapshot_week():
+    return WeeklySnapshot.objects.order_by('-hour_interval').values_list('hour_interval', flat=True).first()
+
+
+def top_ranked(interval, limit=100):
+    """The top ``limit`` ranked snapshots of ``interval``."""
+    return (
+        WeeklySnapshot.objects.filter(hour_interval=interval, rank__isnull=False)
+        .select_related('user').order_by('rank', 'user_id')[:limit]
+    )
+
+
+def user_history(user, weeks=52):
+    """``user``'s last ``weeks`` snapshots, newest first."""
+    return WeeklySnapshot.objects.filter(user=user).order_by('-hour_interval')[:weeks]
+
+
+def export_rows(start=None, end=None, chunk_size=2000):
+    """Snapshot rows between ``start`` and ``end`` (inclusive) as tuples in ``EXPORT_FIELDS`` order."""
+    snapshots = WeeklySnapshot.objects.all()
+    if start is not None:
+        snapshots = snapshots.filter(hour_interval__gte=start)
+    if end is not None:
+        snapshots = snapshots.filter(hour_interval__lte=end)
+    rows = snapshots.order_by('hour_interval', 'user_id').values_list(
+        'hour_interval', 'user_id', 'user__username', 'votes_received', 'rating_sum', 'rating_count', 'rank',
+    )
+    for interval, user_id, username, votes_received, rating_sum, rating_count, rank in rows.iterator(chunk_size=chunk_size):
+        average = round(rating_sum / rating_count, 2) if rating_count else None
+        yield f'{interval:%Y-%m-%d}', user_id, username, votes_received, rating_count, average, rank
@@ -1,3 +1,716 @@
-from django.test import TestCase
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import warnings
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from . import exports, rotation, transfer
+from .archive import archive_interval
+from .auth import CachedModelBackend
+from .board import BOARD_TIMEOUT, LOCAL_BOARD_TIMEOUT, board_timeout
+from .builder import AssignmentBuilder
+from .consumers import BoardConsumer
+from .events import board_group
+from .metrics import registry as metrics_registry
+from .models import (
+    ArchivedRating, ArchivedVote, Assignment, Community, Profile, Rating, Rotation, Vote, WeeklySnapshot,
+)
+from .ratings import record_ratings
+from .snapshots import take_snapshot
+from .rotation import ensure_rotated, get_current_interval, get_next_interval, rotate, rotate_group, splice_in, splice_out
+from .transfer import RowCountMismatch, copy_tables, row_counts, unmatched_permissions
+from .writes import write_transaction
+
+
+class RingTestCase(TestCase):
+    """Five users in one rotated circle for the current interval."""
+
+    def setUp(self):
+        # Cached boards and profiles outlive the rolled-back rows of earlier tests
+        for cache in caches.all():
+            cache.clear()
+        self.interval = get_current_interval()
+        self.users = [User.objects.create_user(f'user{i}') for i in range(5)]
+        rotate_group(self.interval, builder=AssignmentBuilder(seed=1))
+
+    def pairs(self):
+        return dict(
+            Assignment.objects.filter(hour_interval=self.interval, is_active=True)
+            .values_list('user_id', 'assigned_to_id')
+        )
+
+    def assertValidRing(self):
+        """Every active user gives and receives exactly once, in a single circle, with matching votes."""
+        pairs = self.pairs()
+        active = set(User.objects.filter(is_active=True).values_list('id', flat=True))
+        self.assertEqual(set(pairs), active)
+        self.assertEqual(sorted(pairs.values()), sorted(active))
+
+        start = next(iter(pairs))
+        current, visited = pairs[start], 1
+        while current != start:
+            current, visited = pairs[current], visited + 1
+        self.assertEqual(visited, len(pairs), "the assignments split into several circles")
+
+        votes = dict(
+            Vote.objects.filter(hour_interval=self.interval).values_list('voter_id', 'recipient_id')
+        )
+        self.assertEqual(votes, pairs)
+        self.assertEqual(
+            Rotation.objects.get(hour_interval=self.interval, community=None).user_count, len(pairs)
+        )
+
+
+class SpliceTests(RingTestCase):
+
+    def test_new_user_is_spliced_in(self):
+        user = User.objects.create_user('newcomer')
+        self.assertIn(user.id, self.pairs())
+        self.assertValidRing()
+
+    def test_splice_in_twice_is_a_no_op(self):
+        self.assertFalse(splice_in(self.users[0]))
+        self.assertValidRing()
+
+    def test_splice_in_waits_for_the_rotation(self):
+        self.assertFalse(splice_in(self.users[0], interval=get_next_interval(self.interval)))
+        self.assertFalse(Assignment.objects.filter(hour_interval=get_next_interval(self.interval)).exists())
+
+    def test_deactivated_user_is_spliced_out(self):
+        user = self.users[2]
+        user.is_active = False
+        user.save()
+        self.assertNotIn(user.id, self.pairs())
+        self.assertNotIn(user.id, self.pairs().values())
+        self.assertValidRing()
+        self.assertFalse(splice_out(user))
+
+    def test_splice_out_down_to_one_user(self):
+        for user in self.users[1:]:
+            splice_out(user)
+            User.objects.filter(pk=user.pk).update(is_active=False)
+        self.assertEqual(self.pairs(), {self.users[0].id: self.users[0].id})
+        self.assertValidRing()
+
+
+class BoardTimeoutTests(SimpleTestCase):
+
+    def test_local_memory_boards_expire_quickly(self):
+        self.assertEqual(board_timeout(), LOCAL_BOARD_TIMEOUT)
+
+    def test_shared_cache_keeps_boards_for_the_interval(self):
+        tmpdir = tempfile.mkdtemp(prefix='amiga-test-')
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tmpdir}}
+        with override_settings(CACHES=shared):
+            self.assertEqual(board_timeout(), BOARD_TIMEOUT)
+
+
+class RequestProfileTests(TestCase):
+
+    def setUp(self):
+        metrics_registry.reset()
+        self.addCleanup(metrics_registry.reset)
+        self.user = User.objects.create_user('profiled', password='pw')
+
+    @override_settings(REQUEST_PROFILE_SAMPLE_RATE=1, REQUEST_PROFILE_SLOW_MS=0)
+    async def test_async_requests_are_profiled(self):
+        await self.async_client.aforce_login(self.user)
+        with mock.patch.object(pstats, 'Stats', wraps=pstats.Stats) as stats:
+            response = await self.async_client.get('/votes/')
+        self.assertEqual(response.status_code, 200)
+
+        [profile] = metrics_registry.snapshot()['slow_profiles']
+        self.assertEqual(profile['path'], '/votes/')
+        # One profiler for the event loop, one for the request's sync thread
+        self.assertEqual(len(stats.call_args_list[0].args), 2)
+
+
+class AsyncExportTests(RingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user('staff', is_staff=True)
+
+    async def fetch(self, url):
+        await self.async_client.aforce_login(self.staff)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            response = await self.async_client.get(url)
+            content = b''.join([chunk async for chunk in response])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([str(warning.message) for warning in caught], [])
+        return content.decode()
+
+    async def test_export_streams_without_buffering(self):
+        content = await self.fetch('/votes/export/votes/')
+        lines = content.splitlines()
+        self.assertEqual(lines[0], 'id,voter_id,recipient_id,assignment_id,hour_interval,timestamp,awaiting_rating')
+        self.assertEqual(len(lines), 1 + await Vote.objects.acount())
+
+    async def test_leaderboard_export_streams_without_buffering(self):
+        content = await self.fetch('/votes/leaderboard/export/?format=json')
+        self.assertEqual(json.loads(content), [])
+
+
+class ExportTests(RingTestCase):
+    """The current circle plus one from two weeks back."""
+
+    def setUp(self):
+        super().setUp()
+        self.old = self.interval - timedelta(weeks=2)
+        rotate_group(self.old, builder=AssignmentBuilder(seed=2))
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+
+    def vote_ids(self, interval=None):
+        votes = Vote.objects.order_by('id')
+        if interval is not None:
+            votes = votes.filter(hour_interval=interval)
+        return list(votes.values_list('id', flat=True))
+
+    def fetch(self, params=None, table='votes'):
+        response = self.client.get(f'/votes/export/{table}/', params or {})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        lines = self.fetch().splitlines()
+        self.assertEqual(lines[0], ','.join(exports.TABLES['votes'][1]))
+        self.assertEqual([int(line.split(',')[0]) for line in lines[1:]], self.vote_ids())
+
+    def test_jsonl(self):
+        rows = [json.loads(line) for line in self.fetch({'format': 'jsonl'}).splitlines()]
+        self.assertEqual([row['id'] for row in rows], self.vote_ids())
+        self.assertEqual(set(rows[0]), set(exports.TABLES['votes'][1]))
+
+    def test_from_and_to_are_inclusive_days(self):
+        def ids(params):
+            return [json.loads(line)['id'] for line in self.fetch({'format': 'jsonl', **params}).splitlines()]
+
+        self.assertEqual(ids({'from': f'{self.interval:%Y-%m-%d}'}), self.vote_ids(self.interval))
+        self.assertEqual(ids({'to': f'{self.old:%Y-%m-%d}'}), self.vote_ids(self.old))
+        self.assertEqual(ids({'from': f'{self.old:%Y-%m-%d}', 'to': f'{self.old:%Y-%m-%d}'}), self.vote_ids(self.old))
+
+    def test_unknown_table_or_format(self):
+        self.assertEqual(self.client.get('/votes/export/profiles/').status_code, 400)
+        self.assertEqual(self.client.get('/votes/export/votes/', {'format': 'xml'}).status_code, 400)
+        with self.assertRaises(ValueError):
+            exports.stream('votes', 'xml')
+
+    def test_staff_only(self):
+        self.client.force_login(self.users[0])
+        self.assertEqual(self.client.get('/votes/export/votes/').status_code, 302)
+
+    def test_export_history_command(self):
+        tmpdir = tempfile.mkdtemp(prefix='amiga-test-')
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        path = os.path.join(tmpdir, 'votes.csv')
+        out = StringIO()
+        call_command('export_history', 'votes', '--from', f'{self.interval:%Y-%m-%d}', '--output', path, stdout=out)
+
+        self.assertIn(f"Exported {len(self.vote_ids(self.interval))} votes row(s)", out.getvalue())
+        with open(path, newline='', encoding='utf-8') as f:
+            self.assertEqual(f.read(), self.fetch({'from': f'{self.interval:%Y-%m-%d}'}))
+
+        out = StringIO()
+        call_command('export_history', 'votes', '--format', 'jsonl', '--chunk-size', '2', stdout=out)
+        self.assertEqual(out.getvalue(), self.fetch({'format': 'jsonl'}))
+
+        with self.assertRaises(CommandError):
+            call_command('export_history', 'votes', '--from', 'last week', stdout=StringIO())
+
+
+class CachedUserTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('cached', password='pw')
+        self.backend = CachedModelBackend()
+
+    def test_users_are_not_cached_in_local_memory(self):
+        self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(1):
+            self.backend.get_user(self.user.pk)
+
+    def test_users_are_cached_in_a_shared_cache(self):
+        tmpdir = tempfile.mkdtemp(prefix='amiga-test-')
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tmpdir}}
+        with override_settings(CACHES=shared):
+            self.backend.get_user(self.user.pk)
+            with self.assertNumQueries(0):
+                self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+
+            self.user.is_active = False
+            self.user.save()
+            self.assertIsNone(self.backend.get_user(self.user.pk))
+
+
+class MissedRotationTests(TestCase):
+
+    def test_first_view_of_the_week_rotates_the_group(self):
+        users = [User.objects.create_user(f'user{i}', password='pw') for i in range(3)]
+        self.client.force_login(users[0])
+
+        response = self.client.get('/votes/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['user_assignment'].user_id, users[0].id)
+        self.assertEqual(Rotation.objects.get(hour_interval=get_current_interval()).user_count, 3)
+        self.assertFalse(ensure_rotated(get_current_interval()))
+
+
+class RotationScheduleTests(SimpleTestCase):
+
+    def test_cron_runs_shortly_after_the_rotation(self):
+        with open(settings.BASE_DIR / 'railway.cron.json') as f:
+            minute, hour, _, _, weekday = json.load(f)['deploy']['cronSchedule'].split()
+        self.assertEqual(settings.TIME_ZONE, 'UTC')
+        self.assertEqual(int(hour), rotation.ROTATION_HOUR)
+        self.assertLess(int(minute), 30)
+        # cron counts weekdays from Sunday, Python from Monday
+        self.assertEqual((int(weekday) - 1) % 7, rotation.ROTATION_WEEKDAY)
+
+
+class GroupMoveTests(RingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.community = Community.objects.create(name='Book club')
+        members = self.users[:2]
+        Profile.objects.filter(user__in=members).update(community=self.community)
+        rotate_group(self.interval, self.community.id, force=True)
+
+    def group_pairs(self, community_id):
+        return dict(
+            Assignment.objects.filter(hour_interval=self.interval, community_id=community_id)
+            .values_list('user_id', 'assigned_to_id')
+        )
+
+    def test_force_rotate_after_moving_a_member_back(self):
+        moved = self.users[0]
+        Profile.objects.filter(user=moved).update(community=None)
+
+        results = rotate(self.interval, force=True)
+
+        self.assertEqual([result['error'] for result in results], [None, None])
+        self.assertIn(moved.id, self.group_pairs(None))
+        self.assertEqual(self.group_pairs(self.community.id), {self.users[1].id: self.users[1].id})
+        self.assertEqual(Assignment.objects.filter(hour_interval=self.interval).count(), len(self.users))
+
+    def test_board_events_go_to_the_members_community(self):
+        layer = mock.Mock(group_send=mock.AsyncMock())
+        with mock.patch('votes.events.get_channel_layer', return_value=layer):
+            with self.captureOnCommitCallbacks(execute=True):
+                splice_out(self.users[0])
+            with self.captureOnCommitCallbacks(execute=True):
+                splice_out(self.users[2])
+        self.assertEqual(
+            [call.args[0] for call in layer.group_send.call_args_list],
+            [board_group(self.community.id), board_group(None)],
+        )
+
+    async def test_pages_only_hear_their_own_board(self):
+        user = await User.objects.select_related('profile').aget(pk=self.users[0].pk)
+        communicator = WebsocketCommunicator(BoardConsumer.as_asgi(), '/ws/votes/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        layer = get_channel_layer()
+        message = {'type': 'votes.event', 'payload': {'event': 'assignments_changed'}}
+        await layer.group_send(board_group(None), message)
+        self.assertTrue(await communicator.receive_nothing())
+        await layer.group_send(board_group(self.community.id), message)
+        self.assertEqual(await communicator.receive_json_from(), {'event': 'assignments_changed'})
+        await communicator.disconnect()
+
+
+class AssignmentsApiTests(RingTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.users[0])
+
+    def test_cursor_paging_returns_every_pair_once(self):
+        pairs, cursor = [], 0
+        while cursor is not None:
+            data = self.client.get('/votes/get_assignments/', {'cursor': cursor, 'limit': 2}).json()
+            self.assertLessEqual(len(data['assignments']), 2)
+            pairs += data['assignments']
+            cursor = data['next_cursor']
+        usernames = dict(User.objects.values_list('id', 'username'))
+        self.assertEqual(
+            sorted(pairs), sorted([usernames[giver], usernames[receiver]] for giver, receiver in self.pairs().items())
+        )
+
+    def test_invalid_paging(self):
+        for params in ({'cursor': 'x'}, {'cursor': -1}, {'limit': 0}, {'limit': 10**6}):
+            self.assertEqual(self.client.get('/votes/get_assignments/', params).status_code, 400)
+
+    def test_etag_until_the_board_changes(self):
+        response = self.client.get('/votes/get_assignments/')
+        etag = response['ETag']
+
+        not_modified = self.client.get('/votes/get_assignments/', headers={'If-None-Match': etag})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user('newcomer')
+        changed = self.client.get('/votes/get_assignments/', headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+
+class DeleteTests(RingTestCase):
+
+    def test_delete_user(self):
+        self.users[1].delete()
+        self.assertValidRing()
+
+    def test_bulk_delete_adjacent_users(self):
+        pairs = self.pairs()
+        first = self.users[0].id
+        User.objects.filter(id__in=[first, pairs[first]]).delete()
+        self.assertValidRing()
+
+    def test_bulk_delete_run_of_users(self):
+        pairs = self.pairs()
+        run = [self.users[0].id]
+        for _ in range(2):
+            run.append(pairs[run[-1]])
+        User.objects.filter(id__in=run).delete()
+        self.assertValidRing()
+
+    def test_bulk_delete_all_but_one(self):
+        User.objects.exclude(pk=self.users[3].pk).delete()
+        self.assertEqual(self.pairs(), {self.users[3].id: self.users[3].id})
+        self.assertValidRing()
+
+    def test_bulk_delete_everybody(self):
+        User.objects.all().delete()
+        self.assertEqual(self.pairs(), {})
+        self.assertEqual(Rotation.objects.get(hour_interval=self.interval).user_count, 0)
+
+    def test_delete_discards_ratings_given(self):
+        vote = Vote.objects.get(recipient=self.users[0], hour_interval=self.interval)
+        record_ratings(self.users[0], {vote.id: 4})
+        self.users[0].delete()
+        self.assertEqual(Profile.objects.get(user_id=vote.voter_id).rating_count, 0)
+        self.assertValidRing()
+
+
+class RatingTotalsTests(RingTestCase):
+
+    def votes_received(self, user):
+        return list(Vote.objects.filter(recipient=user).values_list('id', flat=True))
+
+    def test_record_ratings_updates_totals(self):
+        rater = self.users[0]
+        [vote_id] = self.votes_received(rater)
+        voter_id = Vote.objects.get(pk=vote_id).voter_id
+
+        self.assertEqual(record_ratings(rater, {vote_id: 4, 0: 5}), {vote_id: 'created', 0: 'not_found'})
+        self.assertEqual(record_ratings(rater, {vote_id: 4}), {vote_id: 'unchanged'})
+        self.assertEqual(record_ratings(rater, {vote_id: 2}), {vote_id: 'updated'})
+
+        profile = Profile.objects.get(user_id=voter_id)
+        self.assertEqual((profile.rating_sum, profile.rating_count), (2, 1))
+        self.assertFalse(Vote.objects.get(pk=vote_id).awaiting_rating)
+
+    def test_votes_received_by_someone_else_cannot_be_rated(self):
+        other_vote = Vote.objects.exclude(recipient=self.users[0]).first()
+        self.assertEqual(record_ratings(self.users[0], {other_vote.id: 5}), {other_vote.id: 'not_found'})
+        self.assertFalse(Rating.objects.exists())
+
+    def test_rebuild_rating_totals_verify(self):
+        for user in self.users:
+            record_ratings(user, {vote_id: 3 for vote_id in self.votes_received(user)})
+        call_command('rebuild_rating_totals', verify=True, stdout=StringIO())
+
+        Profile.objects.filter(user=self.users[0]).update(rating_sum=99)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rating_totals', verify=True, stdout=StringIO())
+
+        call_command('rebuild_rating_totals', stdout=StringIO())
+        call_command('rebuild_rating_totals', verify=True, stdout=StringIO())
+        self.assertEqual(Profile.objects.get(user=self.users[0]).rating_sum, 3)
+
+
+@override_settings(VOTES_ARCHIVE_AFTER_WEEKS=26)
+class ArchiveTests(RingTestCase):
+    """A week past the horizon, voted on and rated, next to the current one."""
+
+    def setUp(self):
+        super().setUp()
+        self.old = self.interval - timedelta(weeks=30)
+        rotate_group(self.old, builder=AssignmentBuilder(seed=2))
+        for score, user in enumerate(self.users, start=1):
+            votes = Vote.objects.filter(hour_interval=self.old, recipient=user).values_list('id', flat=True)
+            record_ratings(user, {vote_id: score for vote_id in votes})
+        Rating.objects.update(rated_at=self.old + timedelta(days=1))
+
+    def snapshot(self, interval):
+        take_snapshot(interval)
+        return list(
+            WeeklySnapshot.objects.filter(hour_interval=interval).order_by('user_id')
+            .values_list('user_id', 'votes_received', 'rating_sum', 'rating_count', 'rank')
+        )
+
+    def test_archive_moves_the_week_out_of_the_hot_tables(self):
+        self.assertEqual(archive_interval(self.old), (len(self.users), len(self.users)))
+
+        self.assertFalse(Assignment.objects.filter(hour_interval=self.old).exists())
+        self.assertFalse(Rating.objects.exists())
+        self.assertEqual(ArchivedVote.objects.filter(hour_interval=self.old).count(), len(self.users))
+        self.assertValidRing()
+
+    def test_rating_totals_survive_archiving(self):
+        call_command('rebuild_rating_totals', verify=True, stdout=StringIO())
+        archive_interval(self.old)
+        call_command('rebuild_rating_totals', verify=True, stdout=StringIO())
+
+    def test_snapshot_of_an_archived_week_is_unchanged(self):
+        before = self.snapshot(self.old)
+        self.assertEqual(len(before), len(self.users))
+        archive_interval(self.old)
+        self.assertEqual(self.snapshot(self.old), before)
+
+    def test_rerun_is_a_no_op(self):
+        call_command('archive_intervals', stdout=StringIO())
+        archived = (ArchivedVote.objects.count(), ArchivedRating.objects.count())
+        self.assertEqual(archived, (len(self.users), len(self.users)))
+
+        out = StringIO()
+        call_command('archive_intervals', stdout=out)
+        self.assertIn("Archived 0 interval(s)", out.getvalue())
+        self.assertEqual(archive_interval(self.old), (0, 0))
+        self.assertEqual((ArchivedVote.objects.count(), ArchivedRating.objects.count()), archived)
+        self.assertValidRing()
+
+
+@skipUnless(connection.vendor == 'postgresql', "needs PostgreSQL (run the tests with DATABASE_URL set)")
+class ConcurrentRatingTests(TransactionTestCase):
+    """Two submits of the same rating at once must count it once (SQLite can't run them concurrently)."""
+
+    def test_concurrent_submits_count_one_rating(self):
+        interval = get_current_interval()
+        users = [User.objects.create_user(f'user{i}') for i in range(3)]
+        rotate_group(interval)
+        rater = users[0]
+        vote = Vote.objects.get(recipient=rater, hour_interval=interval)
+        first_recorded = threading.Event()
+        second_waiting = threading.Event()
+        errors = []
+
+        def first():
+            try:
+                with transaction.atomic():
+                    record_ratings(rater, {vote.id: 4})
+                    first_recorded.set()
+                    second_waiting.wait(5)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        def second():
+            first_recorded.wait(5)
+            # Give record_ratings time to block before the first one commits
+            threading.Timer(0.3, second_waiting.set).start()
+            try:
+                record_ratings(rater, {vote.id: 4})
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=first), threading.Thread(target=second)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+
+        self.assertEqual(errors, [])
+        profile = Profile.objects.get(user_id=vote.voter_id)
+        self.assertEqual((profile.rating_sum, profile.rating_count), (4, 1))
+        call_command('rebuild_rating_totals', verify=True, stdout=StringIO())
+
+
+@skipUnless(connection.vendor == 'postgresql', "needs PostgreSQL (run the tests with DATABASE_URL set)")
+class CopyToPostgresTests(TransactionTestCase):
+    """``votes.transfer`` from a migrated SQLite file into the test database."""
+
+    alias = 'copy_test_source'
+
+    @classmethod
+    def setUpClass(cls):
+        # A throwaway alias, registered (and allowed) here rather than in settings.DATABASES
+        cls.tmpdir = tempfile.mkdtemp(prefix='amiga-test-')
+        connections.settings[cls.alias] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            cls.alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(cls.tmpdir, 'source.sqlite3')},
+        })[cls.alias]
+        cls.databases = {DEFAULT_DB_ALIAS, cls.alias}
+        super().setUpClass()
+        call_command('migrate', database=cls.alias, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[cls.alias].close()
+        del connections[cls.alias]
+        del connections.settings[cls.alias]
+        shutil.rmtree(cls.tmpdir, ignore_errors=True)
+
+    def setUp(self):
+        # bulk_create sends no signals, which would write to the default database
+        source = self.alias
+        community = Community.objects.using(source).create(name='Book club')
+        users = User.objects.using(source).bulk_create(
+            [User(id=user_id, username=f'user{user_id}', is_staff=True) for user_id in (10, 11, 12)]
+        )
+        Profile.objects.using(source).bulk_create(
+            [Profile(user=user, community=community, rating_sum=4, rating_count=1) for user in users]
+        )
+        group = Group.objects.using(source).create(name='moderators')
+        group.permissions.add(*Permission.objects.using(source).filter(codename__in=['change_vote', 'view_rating']))
+        users[0].groups.add(group)
+        users[1].user_permissions.add(Permission.objects.using(source).get(codename='delete_rating'))
+
+        # Permission rows are the target's own: make sure their ids differ from the source's
+        Permission.objects.update(id=F('id') + 1000)
+
+    def test_copy(self):
+        copied = {model._meta.label: rows for model, rows in copy_tables(self.alias)}
+
+        self.assertEqual(copied['auth.User'], 3)
+        self.assertEqual(copied['auth.User_groups'], 1)
+        self.assertEqual(row_counts(DEFAULT_DB_ALIAS), row_counts(self.alias))
+        self.assertEqual(Profile.objects.get(user_id=10).community.name, 'Book club')
+        # Sequences moved past the copied ids
+        self.assertEqual(User.objects.create_user('newcomer').id, 13)
+
+    def test_permissions_are_matched_by_codename(self):
+        self.assertEqual(unmatched_permissions(self.alias, DEFAULT_DB_ALIAS), [])
+        list(copy_tables(self.alias))
+
+        self.assertEqual(
+            User.objects.get(id=10).get_all_permissions(), {'votes.change_vote', 'votes.view_rating'}
+        )
+        self.assertEqual(User.objects.get(id=11).get_all_permissions(), {'votes.delete_rating'})
+
+    def test_missing_permission_is_reported(self):
+        Permission.objects.filter(codename='delete_rating').delete()
+        self.assertEqual(unmatched_permissions(self.alias, DEFAULT_DB_ALIAS), ['votes.delete_rating'])
+
+    def test_short_copy_rolls_back(self):
+        copy_table = transfer.copy_table
+
+        def copy_and_lose_a_row(model, *args, **kwargs):
+            rows = copy_table(model, *args, **kwargs)
+            if model is Community:
+                Community.objects.all().delete()
+            return rows
+
+        with mock.patch.object(transfer, 'copy_table', copy_and_lose_a_row):
+            with self.assertRaises(RowCountMismatch):
+                list(copy_tables(self.alias))
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Group.objects.exists())
+
+
+class WriteTransactionTests(SimpleTestCase):
+    """Lock ordering of ``write_transaction`` on a real SQLite file (the in-memory test database locks differently)."""
+
+    alias = 'write_lock_test'
+
+    @classmethod
+    def setUpClass(cls):
+        # A throwaway alias, registered (and allowed) here rather than in settings.DATABASES
+        cls.tmpdir = tempfile.mkdtemp(prefix='amiga-test-')
+        connections.settings[cls.alias] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            cls.alias: {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(cls.tmpdir, 'writes.sqlite3'),
+                'OPTIONS': {**settings.SQLITE_TUNED_OPTIONS, 'timeout': 3},
+            },
+        })[cls.alias]
+        cls.databases = {cls.alias}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[cls.alias].close()
+        del connections[cls.alias]
+        del connections.settings[cls.alias]
+        shutil.rmtree(cls.tmpdir, ignore_errors=True)
+
+    def setUp(self):
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute('CREATE TABLE writes (name TEXT)')
+
+    def _insert(self, name):
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute('INSERT INTO writes VALUES (%s)', [name])
+
+    def test_nested_write_does_not_queue_behind_waiting_writer(self):
+        outer_has_lock = threading.Event()
+        second_waiting = threading.Event()
+        errors = []
+
+        def outer():
+            try:
+                # BEGIN IMMEDIATE: this thread holds the database write lock from here on
+                with transaction.atomic(using=self.alias):
+                    self._insert('outer')
+                    outer_has_lock.set()
+                    second_waiting.wait(5)
+                    with write_transaction(using=self.alias):
+                        self._insert('nested')
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections[self.alias].close()
+
+        def second():
+            outer_has_lock.wait(5)
+            # Give write_transaction time to take the process lock and block on BEGIN IMMEDIATE
+            threading.Timer(0.3, second_waiting.set).start()
+            try:
+                with write_transaction(using=self.alias):
+                    self._insert('second')
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections[self.alias].close()
+
+        threads = [threading.Thread(target=outer), threading.Thread(target=second)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+
+        self.assertEqual(errors, [])
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute('SELECT name FROM writes')
+            self.assertEqual(sorted(row[0] for row in cursor.fetchall()), ['nested', 'outer', 'second'])
+        connections[self.alias].close()
@@ -0,0 +1,165 @@
+"""
+Moving the SQLite database to PostgreSQL.
+
+``copy_tables()`` reads every row of the app's tables from a SQLite file
+through a temporary connection alias (so Django's converters turn SQLite's
+text dates and 0/1 booleans back into Python values) and streams them into
+the target with ``COPY ... FROM STDIN``. That is much faster than INSERTs.
+Primary keys are copied as they are, so the sequences are reset afterwards.
+Groups and the users' group memberships and permissions come along too.
+``migrate`` creates each database's own permission rows, so their ids can
+differ: the permission tables are translated by app, model and codename.
+Everything happens in one transaction on the target, and the row counts
+are compared before it commits: a failed or short copy leaves it untouched.
+
+Both databases must be migrated to the same state first, and the target
+must be empty: ``manage.py copy_to_postgres`` checks both.
+"""
+
+from contextlib import contextmanager
+
+from django.contrib.auth.models import Group, Permission, User
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+
+from .models import (
+    ArchivedRating, ArchivedVote, Assignment, Community, Profile, Rating, Rotation, Vote, WeeklySnapshot,
+)
+
+# The auto-created many-to-many tables behind User.groups, User.user_permissions and Group.permissions
+USER_GROUPS = User.groups.through
+USER_PERMISSIONS = User.user_permissions.through
+GROUP_PERMISSIONS = Group.permissions.through
+PERMISSION_TABLES = [USER_PERMISSIONS, GROUP_PERMISSIONS]
+
+# Parents before children (foreign keys are deferred on PostgreSQL anyway)
+MODELS = [
+    User, Group, USER_GROUPS, USER_PERMISSIONS, GROUP_PERMISSIONS,
+    Community, Profile, Rotation, Assignment, Vote, Rating, WeeklySnapshot, ArchivedVote, ArchivedRating,
+]
+
+SOURCE_ALIAS = 'sqlite_source'
+CHUNK_SIZE = 5000
+
+
+@contextmanager
+def sqlite_source(path, alias=SOURCE_ALIAS):
+    """Register the SQLite file at ``path`` as connection ``alias`` for the duration of the block."""
+    # configure_settings() fills in the defaults (and insists on a 'default' alias)
+    connections.settings[alias] = connections.configure_settings({
+        DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+        alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(path)},
+    })[alias]
+    try:
+        yield connections[alias]
+    finally:
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+
+class RowCountMismatch(Exception):
+    """The copy doesn't hold the source's rows; ``counts`` is ``{label: (in source, in target)}``."""
+
+    def __init__(self, counts):
+        self.counts = counts
+        super().__init__('; '.join(
+            f"{label} ({source} in SQLite, {target} in PostgreSQL)" for label, (source, target) in counts.items()
+        ))
+
+
+def unapplied_migrations(using):
+    """Migrations not yet applied to ``using``, as ``app.name`` strings."""
+    executor = MigrationExecutor(connections[using])
+    targets = executor.loader.graph.leaf_nodes()
+    return [f"{migration.app_label}.{migration.name}" for migration, _ in executor.migration_plan(targets)]
+
+
+def row_counts(using, models=MODELS):
+    return {model._meta.label: model._base_manager.using(using).count() for model in models}
+
+
+def _permission_keys(using):
+    """``{permission_id: (app_label, model, codename)}`` in ``using``."""
+    return {
+        pk: (app_label, model, codename)
+        for pk, app_label, model, codename in Permission.objects.using(using).values_list(
+            'pk', 'content_type__app_label', 'content_type__model', 'codename'
+        )
+    }
+
+
+def permission_map(source, target):
+    """Source permission id -> target permission id (None if the target lacks it)."""
+    target_ids = {key: pk for pk, key in _permission_keys(target).items()}
+    return {pk: target_ids.get(key) for pk, key in _permission_keys(source).items()}
+
+
+def unmatched_permissions(source, target):
+    """Permissions granted in ``source`` that ``target`` doesn't have, as ``app.codename`` strings."""
+    mapping = permission_map(source, target)
+    keys = _permission_keys(source)
+    used = set()
+    for model in PERMISSION_TABLES:
+        used.update(model._base_manager.using(source).values_list('permission_id', flat=True))
+    return sorted(f"{keys[pk][0]}.{keys[pk][2]}" for pk in used if mapping.get(pk) is None)
+
+
+def copy_table(model, source, target, chunk_size=CHUNK_SIZE, permissions=None):
+    """
+    COPY every row of ``model`` from ``source`` into ``target``. Returns the number of rows.
+
+    ``permissions`` maps permission ids for the permission tables (see ``permission_map``).
+    """
+    fields = model._meta.concrete_fields
+    quote = connections[target].ops.quote_name
+    statement = "COPY {} ({}) FROM STDIN".format(
+        quote(model._meta.db_table), ', '.join(quote(field.column) for field in fields),
+    )
+    rows = (
+        model._base_manager.using(source).order_by('pk')
+        .values_list(*(field.attname for field in fields))
+        .iterator(chunk_size=chunk_size)
+    )
+    if permissions is not None:
+        position = [field.attname for field in fields].index('permission_id')
+        rows = (
+            (*row[:position], permissions[row[position]], *row[position + 1:]) for row in rows
+        )
+    copied = 0
+    with connections[target].cursor() as cursor, cursor.copy(statement) as copy:
+        for row in rows:
+            copy.write_row(row)
+            copied += 1
+    return copied
+
+
+def reset_sequences(models, using):
+    """Move each table's id sequence past the highest copied id."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+
+
+def copy_tables(source, target=DEFAULT_DB_ALIAS, models=MODELS, chunk_size=CHUNK_SIZE):
+    """
+    Copy ``models`` from ``source`` into ``target`` in one transaction.
+
+    Yields ``(model, rows)`` as each table finishes. Raises ``RowCountMismatch``,
+    rolling everything back, if any table's row count differs afterwards.
+    """
+    permissions = permission_map(source, target)
+    with transaction.atomic(using=target):
+        for model in models:
+            remap = permissions if model in PERMISSION_TABLES else None
+            yield model, copy_table(model, source, target, chunk_size, remap)
+        reset_sequences(models, target)
+
+        expected, copied = row_counts(source, models), row_counts(target, models)
+        mismatched = {
+            label: (expected[label], copied[label]) for label in expected if expected[label] != copied[label]
+        }
+        if mismatched:
+            raise RowCountMismatch(mismatched)
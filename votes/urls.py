@@ -15,6 +15,12 @@ urlpatterns = [
     ), name='logout'),
     path('votes/get_assignments/', views.get_assignments, name='get_assignments'),
     path('votes/submit_rating/', views.submit_rating, name='submit_rating'),
+    path('votes/submit_ratings/', views.submit_ratings, name='submit_ratings'),
+    path('votes/leaderboard/', views.leaderboard, name='leaderboard'),
+    path('votes/leaderboard/export/', views.leaderboard_export, name='leaderboard_export'),
     path('refresh-assignments/', views.refresh_assignments, name='refresh_assignments'),
+    path('votes/board/stats/', views.board_cache_stats, name='board_cache_stats'),
+    path('votes/stats/requests/', views.request_stats, name='request_stats'),
+    path('votes/export/<str:table>/', views.export_history, name='export_history'),
 
 ]
\ No newline at end of file
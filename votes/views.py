@@ -1,122 +1,55 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from django.contrib.auth.forms import UserCreationForm
+from django.core.handlers.asgi import ASGIRequest
 from django.utils import timezone
-import random
-from datetime import timedelta
-from .models import Assignment, Vote, Profile, Rating
-from django.contrib.auth.models import User
+from asgiref.sync import sync_to_async
+import json
+from bisect import bisect_right
+from functools import partial
+from datetime import datetime, timedelta
+from . import exports
+from .models import Assignment, Vote
+from .board import aget_board, aget_version, board_cache_alias, board_timeout, cache_stats, get_board
+from .metrics import registry as metrics_registry
+from .profiles import aget_profile
+from .ratings import record_rating, record_ratings, unrated_votes
+from .rotation import ensure_rotated, get_current_interval, get_next_interval, rotate
+from .snapshots import EXPORT_FIELDS, export_rows, latest_snapshot_week, snapshot_weeks, top_ranked, user_history
 
 def home(request):
     return redirect('/votes/')
 
-def register(request):
-    if request.method == 'POST':
-        form = UserCreationForm(request.POST)
-        if form.is_valid():
-            user = form.save()
-            username = form.cleaned_data.get('username')
-            messages.success(request, f'Account created for {username}!')
-            return redirect('login')
-    else:
-        form = UserCreationForm()
-    return render(request, 'votes/registration/register.html', {'form': form})
 @login_required
-def index(request):
-    user = request.user
+async def index(request):
+    user = await request.auser()
     now = timezone.now()
     
-    # Calculate start of current weekly period (Saturday at 20:00)
-    delta_days = (now.weekday() - 5) % 7  # 5 = Saturday
-    last_saturday = now - timedelta(days=delta_days)
-    last_sat_20 = last_saturday.replace(hour=20, minute=0, second=0, microsecond=0)
-    
-    if now < last_sat_20:
-        current_interval = last_sat_20 - timedelta(days=7)
-    else:
-        current_interval = last_sat_20
-
-    # Ensure ALL users have profiles
-    all_users = User.objects.all()
-    for user_obj in all_users:
-        if not hasattr(user_obj, 'profile'):
-            Profile.objects.create(user=user_obj)
-
-    # Check if ALL users have assignments for current weekly interval
-    users_with_assignments = Assignment.objects.filter(
-        hour_interval=current_interval, 
-        is_active=True
-    ).values_list('user_id', flat=True)
-    
-    users_without_assignments = all_users.exclude(id__in=users_with_assignments)
-    
-    # If ANY user is missing assignment, recreate ALL assignments for the interval
-    if users_without_assignments.exists() or Assignment.objects.filter(hour_interval=current_interval).count() != all_users.count():
-        # Delete existing assignments for this interval
-        Assignment.objects.filter(hour_interval=current_interval).delete()
-        Vote.objects.filter(hour_interval=current_interval).delete()
-        
-        # Create new assignments for ALL users
-        users_list = list(all_users)
-        import random
-        random.shuffle(users_list)
-        
-        if len(users_list) > 1:
-            # Create a circular assignment (user1->user2, user2->user3, ..., last->user1)
-            for i, assigner in enumerate(users_list):
-                assignee = users_list[(i + 1) % len(users_list)]
-                
-                # Create assignment
-                assignment = Assignment.objects.create(
-                    user=assigner,
-                    assigned_to=assignee,
-                    hour_interval=current_interval,
-                    is_active=True
-                )
-                
-                # Create corresponding vote
-                Vote.objects.create(
-                    voter=assigner,
-                    recipient=assignee,
-                    assignment=assignment,
-                    hour_interval=current_interval
-                )
-        elif len(users_list) == 1:
-            # Only one user - assign to themselves
-            single_user = users_list[0]
-            assignment = Assignment.objects.create(
-                user=single_user,
-                assigned_to=single_user,
-                hour_interval=current_interval,
-                is_active=True
-            )
-            Vote.objects.create(
-                voter=single_user,
-                recipient=single_user,
-                assignment=assignment,
-                hour_interval=current_interval
-            )
-
-    # Get ALL current assignments
-    all_assignments = Assignment.objects.filter(hour_interval=current_interval, is_active=True).select_related('user', 'assigned_to')
-    
-    # User's current assignment
-    user_assignment = all_assignments.filter(user=user).first()
+    # Assignments are built by the rotation engine (manage.py rotate); if the
+    # scheduled run was missed, the first view of the week rotates the group
+    current_interval = get_current_interval(now)
 
-    # Check for unrated votes (people who voted for user in previous intervals)
-    previous_votes = Vote.objects.filter(
-        recipient=user,
-        hour_interval__lt=current_interval
-    ).exclude(
-        ratings__rater=user
-    ).select_related('voter').order_by('-hour_interval')
+    # The board shows the user's own group
+    profile = await aget_profile(user)
+    await sync_to_async(ensure_rotated)(current_interval, profile.community_id)
 
-    unrated_vote = previous_votes.first() if previous_votes.exists() else None
+    # User's current assignment (one indexed row; the board itself is only
+    # needed when its cached fragment has expired, see the template)
+    user_assignment = await Assignment.objects.filter(
+        user=user, hour_interval=current_interval, is_active=True
+    ).select_related('assigned_to').afirst()
+
+    # Check for unrated votes (people who voted for user in previous intervals)
+    unrated_vote = await unrated_votes(user, current_interval).afirst()
 
     # Calculate next weekly interval (next Saturday 20:00)
-    next_interval = current_interval + timedelta(days=7)
+    next_interval = get_next_interval(current_interval)
     time_remaining = next_interval - now
     
     # Calculate countdown components
@@ -127,7 +60,12 @@ def index(request):
     seconds = total_seconds % 60
 
     context = {
-        'all_assignments': all_assignments,
+        # Called by the template only on a fragment cache miss
+        'all_assignments': partial(get_board, current_interval, profile.community_id),
+        'board_group': profile.community_id or 'default',
+        'board_version': await aget_version(),
+        'board_cache': board_cache_alias(),
+        'board_timeout': board_timeout(),
         'user_assignment': user_assignment,
         'current_interval': current_interval,
         'unrated_vote': unrated_vote,
@@ -136,61 +74,245 @@ def index(request):
         'minutes_remaining': minutes,
         'seconds_remaining': seconds,
         'next_interval': next_interval.strftime('%Y-%m-%d'),
+        'next_interval_at': next_interval.isoformat(),
         'user': user,
-        'total_users': all_users.count(),
+        'profile': profile,
     }
-    return render(request, 'votes/index.html', context)
+    # Rendering may build the board, which is sync database work
+    return await sync_to_async(render)(request, 'votes/index.html', context)
 
 
 
 
 @login_required
-def submit_rating(request):
+async def submit_rating(request):
     if request.method == 'POST':
         vote_id = request.POST.get('vote_id')
         score = request.POST.get('score')
         
         try:
-            vote = Vote.objects.get(id=vote_id)
-            if vote.recipient != request.user:
+            score = int(score)
+        except (TypeError, ValueError):
+            score = 0
+        if not 1 <= score <= 5:
+            return JsonResponse({'error': 'Score must be between 1 and 5'}, status=400)
+
+        user = await request.auser()
+        try:
+            vote = await Vote.objects.aget(id=vote_id)
+            if vote.recipient_id != user.id:
                 return JsonResponse({'error': 'Invalid rating'}, status=400)
             
-            rating, created = Rating.objects.get_or_create(
-                rater=request.user,
-                vote=vote,
-                defaults={'rated_user': vote.voter, 'score': score}
-            )
-            
-            if not created:
-                rating.score = score
-                rating.save()
+            # The write itself is a transaction, which has to run in sync code
+            await sync_to_async(record_rating)(user, vote, score)
             
             return JsonResponse({'success': True, 'message': 'Rating submitted!'})
             
-        except Vote.DoesNotExist:
+        except (Vote.DoesNotExist, ValueError):
             return JsonResponse({'error': 'Vote not found'}, status=400)
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+MAX_RATINGS_PER_BATCH = 500
+
 @login_required
-def get_assignments(request):
-    now = timezone.now()
-    current_week = now - timedelta(days=now.weekday())
-    current_week = current_week.replace(hour=0, minute=0, second=0, microsecond=0)
+@require_POST
+def submit_ratings(request):
+    """
+    Rate several votes at once.
 
-    all_assignments = Assignment.objects.filter(hour_interval=current_week, is_active=True).select_related('user', 'assigned_to')
-    
-    assignments_list = [{'assigner': a.user.username, 'assignee': a.assigned_to.username} for a in all_assignments]
+    Expects a JSON body ``{"ratings": [{"vote_id": 1, "score": 4}, ...]}`` and
+    answers with one result per item, in the same order.
+    """
+    try:
+        items = json.loads(request.body)['ratings']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected {"ratings": [{"vote_id": ..., "score": ...}]}'}, status=400)
+    if not isinstance(items, list) or not 1 <= len(items) <= MAX_RATINGS_PER_BATCH:
+        return JsonResponse({'error': f'Send between 1 and {MAX_RATINGS_PER_BATCH} ratings'}, status=400)
+
+    scores = {}
+    parsed = []
+    for item in items:
+        try:
+            vote_id, score = int(item['vote_id']), int(item['score'])
+        except (KeyError, TypeError, ValueError):
+            parsed.append((None, 'Invalid item'))
+            continue
+        if not 1 <= score <= 5:
+            parsed.append((vote_id, 'Score must be between 1 and 5'))
+            continue
+        scores[vote_id] = score
+        parsed.append((vote_id, None))
+
+    statuses = record_ratings(request.user, scores) if scores else {}
+
+    results = []
+    for vote_id, error in parsed:
+        status = 'error' if error else statuses[vote_id]
+        if status == 'not_found':
+            status, error = 'error', 'Vote not found'
+        result = {'vote_id': vote_id, 'status': status}
+        if error:
+            result['error'] = error
+        results.append(result)
+    return JsonResponse({'results': results})
+
+ASSIGNMENTS_PAGE_SIZE = 500
+ASSIGNMENTS_MAX_PAGE_SIZE = 2000
+
+def _assignments_page(request):
+    """``(cursor, limit)`` from the query string, or None if they are invalid."""
+    try:
+        cursor = int(request.GET.get('cursor', 0))
+        limit = int(request.GET.get('limit', ASSIGNMENTS_PAGE_SIZE))
+    except ValueError:
+        return None
+    if cursor < 0 or not 1 <= limit <= ASSIGNMENTS_MAX_PAGE_SIZE:
+        return None
+    return cursor, limit
+
+@login_required
+async def get_assignments(request):
+    """
+    The current board of the user's group as ``[assigner, assignee]`` pairs, oldest assignment first.
+
+    Pass ``cursor`` (the ``next_cursor`` of the previous page) and ``limit``
+    to page through large rosters. Responses carry an ETag tied to the board
+    version, so polling with If-None-Match gets a 304 until something changes.
+    """
+    page = _assignments_page(request)
+    if page is None:
+        return JsonResponse({'error': 'Invalid cursor or limit'}, status=400)
+    cursor, limit = page
 
-    next_week = current_week + timedelta(days=7)
-    time_remaining = next_week - now
+    current_interval = get_current_interval()
+    community_id = (await aget_profile(await request.auser())).community_id
+    # Same as @condition, with the version read through the async cache API
+    etag = quote_etag(
+        f"{current_interval:%Y%m%d%H%M}-{community_id or 'default'}-{await aget_version()}-{cursor}-{limit}"
+    )
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        rows = await aget_board(current_interval, community_id)
+        start = bisect_right([row['id'] for row in rows], cursor)
+        page_rows = rows[start:start + limit]
+        has_more = start + limit < len(rows)
+
+        response = JsonResponse({
+            'interval': current_interval.strftime('%Y-%m-%d'),
+            'next_interval': get_next_interval(current_interval).isoformat(),
+            'assignments': [[row['username'], row['assigned_to']] for row in page_rows],
+            'next_cursor': page_rows[-1]['id'] if has_more else None,
+        })
+    # On 304s too, like @condition
+    response['ETag'] = etag
+    return response
+
+LEADERBOARD_WEEKS = 52
+
+def _parse_week(value):
+    """The interval containing the ``YYYY-MM-DD`` date ``value``, or None if it isn't one."""
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+    return get_current_interval(timezone.make_aware(day.replace(hour=23, minute=59)))
+
+@login_required
+def leaderboard(request):
+    """Top rated users of a closed week and the viewer's own weekly history, from snapshots only."""
+    weeks = list(snapshot_weeks(get_current_interval())[:LEADERBOARD_WEEKS])
+    week = _parse_week(request.GET.get('week')) or latest_snapshot_week()
+
+    context = {
+        'week': week,
+        'weeks': weeks,
+        'rows': top_ranked(week) if week else [],
+        'history': user_history(request.user),
+    }
+    return render(request, 'votes/leaderboard.html', context)
+
+@login_required
+def leaderboard_export(request):
+    """
+    Snapshot history as CSV (default) or JSON, streamed row by row.
+
+    ``from`` and ``to`` (YYYY-MM-DD) limit the weeks exported.
+    """
+    start = _parse_week(request.GET.get('from'))
+    end = _parse_week(request.GET.get('to'))
+    rows = export_rows(start, end)
+
+    if request.GET.get('format') == 'json':
+        def chunks():
+            yield '['
+            for number, row in enumerate(rows):
+                yield (',' if number else '') + json.dumps(dict(zip(EXPORT_FIELDS, row)))
+            yield ']'
+        response = _streaming_response(request, chunks(), content_type='application/json')
+        filename = 'leaderboard.json'
+    else:
+        response = _streaming_response(request, exports.csv_lines(EXPORT_FIELDS, rows), content_type='text/csv')
+        filename = 'leaderboard.csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def _streaming_response(request, lines, content_type):
+    """A ``StreamingHttpResponse`` over ``lines`` that stays streamed under both WSGI and ASGI."""
+    if isinstance(request, ASGIRequest):
+        lines = exports.astream(lines)
+    return StreamingHttpResponse(lines, content_type=content_type)
+
+def _parse_day(value, days=0):
+    """Midnight of the ``YYYY-MM-DD`` date ``value`` plus ``days``, or None if it isn't one."""
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+    return timezone.make_aware(day + timedelta(days=days))
+
+@staff_member_required
+def export_history(request, table):
+    """
+    Stream a whole history table as CSV (default) or JSON lines (``format=jsonl``).
+
+    ``from`` and ``to`` (YYYY-MM-DD, both inclusive) limit the rows by interval
+    (assignments, votes) or rating date (ratings).
+    """
+    fmt = request.GET.get('format', 'csv')
+    if table not in exports.TABLES or fmt not in exports.FORMATS:
+        return JsonResponse({'error': f'Export one of {sorted(exports.TABLES)} as one of {exports.FORMATS}'}, status=400)
+
+    start = _parse_day(request.GET.get('from'))
+    end = _parse_day(request.GET.get('to'), days=1)
+    response = _streaming_response(
+        request, exports.stream(table, fmt, start, end), content_type=exports.CONTENT_TYPES[fmt]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{table}.{fmt}"'
+    return response
+
+@staff_member_required
+def board_cache_stats(request):
+    return JsonResponse(cache_stats())
+
+@staff_member_required
+def request_stats(request):
+    """Per-view timings collected by RequestMetricsMiddleware in this process."""
+    snapshot = metrics_registry.snapshot()
+    if request.GET.get('format') != 'text':
+        return JsonResponse(snapshot)
+
+    lines = [f"{'view':<32} {'count':>7} {'avg_ms':>9} {'max_ms':>9} {'db_ms':>8} {'tpl_ms':>8} {'queries':>8}"]
+    for view, stats in sorted(snapshot['views'].items()):
+        lines.append(
+            f"{view:<32} {stats['count']:>7} {stats['avg_ms']:>9} {stats['max_ms']:>9} "
+            f"{stats['avg_db_ms']:>8} {stats['avg_template_ms']:>8} {stats['avg_queries']:>8}"
+        )
+    for profile in snapshot['slow_profiles']:
+        lines += ['', f"--- {profile['view']} {profile['path']} ({profile['total_ms']} ms)", profile['profile']]
+    return HttpResponse('\n'.join(lines), content_type='text/plain; charset=utf-8')
 
-    return JsonResponse({
-        'assignments': assignments_list,
-        'interval': current_week.strftime('%Y-%m-%d'),
-        'days_remaining': int(time_remaining.total_seconds() // 86400),
-        'hours_remaining': int((time_remaining.total_seconds() % 86400) // 3600)
-    })
 @login_required
 def refresh_assignments(request):
     if request.method == 'POST' and request.user.is_superuser:
@@ -201,53 +323,21 @@ def refresh_assignments(request):
     return redirect('index')
 def recreate_weekly_assignments():
     """Recreate assignments for all users for current week"""
-    now = timezone.now()
-    current_week = now - timedelta(days=now.weekday())
-    current_week = current_week.replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    all_users = list(User.objects.all())
-    
-    # Delete existing assignments for this week
-    Assignment.objects.filter(hour_interval=current_week).delete()
-    Vote.objects.filter(hour_interval=current_week).delete()
-    
-    if len(all_users) < 2:
-        return "Need at least 2 users for assignments"
-    
-    # Create circular assignments
-    random.shuffle(all_users)
-    
-    for i, assigner in enumerate(all_users):
-        assignee = all_users[(i + 1) % len(all_users)]
-        
-        assignment = Assignment.objects.create(
-            user=assigner,
-            assigned_to=assignee,
-            hour_interval=current_week,
-            is_active=True
-        )
-        
-        Vote.objects.create(
-            voter=assigner,
-            recipient=assignee,
-            assignment=assignment,
-            hour_interval=current_week
-        )
-    
-    return f"Created assignments for {len(all_users)} users"
+    results = rotate(force=True)
+    message = f"Created assignments for {sum(result['users'] for result in results)} users"
+    failed = sum(1 for result in results if result['error'])
+    if failed:
+        message += f" ({failed} group(s) failed, see manage.py rotate)"
+    return message
 
-# Add this to your register view to auto-refresh when new users join
 def register(request):
     if request.method == 'POST':
         form = UserCreationForm(request.POST)
         if form.is_valid():
+            # Saving the user splices them into this week's circle (see votes.models)
             user = form.save()
             username = form.cleaned_data.get('username')
             
-            # Auto-refresh assignments when new user registers
-            if User.objects.count() > 1:
-                recreate_weekly_assignments()
-            
             messages.success(request, f'Account created for {username}! Assignments updated!')
             return redirect('login')
     else:
@@ -0,0 +1,39 @@
+"""
+Write serialization for SQLite.
+
+SQLite allows one writer at a time. With several request threads writing at
+once, the losers spin on the busy timeout and can still end up with
+"database is locked". ``write_transaction()`` queues writers inside the
+process on a lock before they open their transaction, so only one thread
+per process competes for the database lock. Other processes are handled by
+the busy timeout and ``IMMEDIATE`` transactions (see settings).
+
+Inside an already open transaction the lock is skipped: with ``IMMEDIATE``
+that transaction holds the database write lock already, and queueing on
+the process lock behind a thread that is itself waiting for the database
+would deadlock until the busy timeout (e.g. ``User.delete()`` closing the
+rotation gap from within the deletion's transaction).
+
+On other backends it is a plain ``transaction.atomic()``.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+_write_lock = threading.RLock()
+
+
+@contextmanager
+def write_transaction(using=None):
+    using = using or DEFAULT_DB_ALIAS
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    with _write_lock:
+        with transaction.atomic(using=using):
+            yield